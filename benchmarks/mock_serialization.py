@@ -0,0 +1,90 @@
+# benchmarks/mock_serialization.py
+"""
+Before/after throughput of a mock endpoint.
+
+In-process (default): drives the ASGI app directly, so the number is the
+per-request cost of the mock itself with no network or client in the way.
+"legacy" is the old handler shape (dict return through FastAPI's
+parameter solving + jsonable_encoder), "prebuilt" is mock_service's
+pre-serialized route.
+
+    python -m benchmarks.mock_serialization --requests 20000
+
+Against a running mock container (build the image before and after a
+change and compare):
+
+    python -m benchmarks.mock_serialization --url http://localhost:8001/login --method POST --rps 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+RESPONSE = {"status": "processed", "transaction_id": "tx123", "items": [{"sku": i, "qty": 1} for i in range(10)]}
+
+
+def legacy_app():
+    from fastapi import FastAPI, Request
+
+    app = FastAPI()
+
+    async def handler(req: Request, _resp=RESPONSE, _delay=0, _failure=0, _publish=[]):
+        return _resp
+
+    app.add_api_route("/charge", handler, methods=["POST"])
+    return app
+
+
+def prebuilt_app():
+    os.environ["MOCK_ENDPOINTS"] = json.dumps([{"path": "/charge", "method": "POST", "response": RESPONSE}])
+    os.environ["NATS_SUBSCRIBE"] = "[]"
+    from orchestration import mock_service
+    return mock_service.create_app()
+
+
+async def drive(app, n: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/charge", "raw_path": b"/charge", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench"), (b"content-length", b"0")],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(200):  # warm-up
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--url", help="benchmark a running mock instead of the in-process apps")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--rps", type=int, default=2000)
+    parser.add_argument("--duration", type=int, default=10)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.url:
+        from orchestration import load_tester
+        summary = load_tester.start_sync(args.url, args.method, args.rps, args.duration, concurrency=200, processes=args.processes)
+        print(load_tester.format_summary(summary))
+        return
+
+    for name, factory in (("legacy", legacy_app), ("prebuilt", prebuilt_app)):
+        rate = asyncio.run(drive(factory(), args.requests))
+        print(f"[bench] {name:<9} {rate:>10.0f} req/s  ({1e6 / rate:.1f} us/request)")
+
+
+if __name__ == "__main__":
+    main()
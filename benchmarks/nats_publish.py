@@ -0,0 +1,155 @@
+# benchmarks/nats_publish.py
+"""
+Publishing N events with nats_manager: connection per message (the old
+publish() path) vs. the pooled client, one flush per message vs.
+publish_many, plus request/reply round trips.
+
+By default runs against an in-process stand-in that speaks just enough of
+the NATS protocol (INFO/CONNECT/PING/PUB/HPUB/SUB/UNSUB/MSG) for nats-py,
+so it needs no server; pass --url to measure a real one:
+
+    python -m benchmarks.nats_publish --messages 10000
+    python -m benchmarks.nats_publish --url nats://localhost:4222
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from orchestration.nats_manager import NatsClientManager
+
+
+class StandInServer:
+    """Minimal single-node NATS server: routes PUB to matching SUBs, nothing else."""
+
+    def __init__(self):
+        self.received = 0
+        self.subs = {}  # (writer, sid) -> subject pattern
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.server = await asyncio.start_server(self._client, host, port)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"nats://{host}:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _client(self, reader, writer):
+        info = {"server_id": "standin", "version": "2.10.0", "proto": 1, "headers": True, "max_payload": 1 << 20}
+        writer.write(b"INFO " + json.dumps(info).encode() + b"\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                op, _, args = line.rstrip(b"\r\n").partition(b" ")
+                op = op.upper()
+                if op == b"PING":
+                    writer.write(b"PONG\r\n")
+                elif op in (b"PUB", b"HPUB"):
+                    parts = args.split()
+                    size = int(parts[-1])
+                    data = await reader.readexactly(size + 2)
+                    self.received += 1
+                    self._route(op, parts, data[:-2])
+                elif op == b"SUB":
+                    parts = args.split()
+                    self.subs[(writer, parts[-1])] = parts[0].decode()
+                elif op == b"UNSUB":
+                    self.subs.pop((writer, args.split()[0]), None)
+                elif op == b"CONNECT":
+                    pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for key in [k for k in self.subs if k[0] is writer]:
+                del self.subs[key]
+            writer.close()
+
+    def _route(self, op, parts, data):
+        subject = parts[0].decode()
+        # PUB subj [reply] size / HPUB subj [reply] hdr_size size
+        reply = parts[1] + b" " if len(parts) == (3 if op == b"PUB" else 4) else b""
+        hdr = parts[-2] + b" " if op == b"HPUB" else b""
+        for (writer, sid), pattern in list(self.subs.items()):
+            if _matches(pattern, subject):
+                writer.write(b"H" * bool(hdr) + b"MSG " + parts[0] + b" " + sid + b" " + reply + hdr
+                             + parts[-1] + b"\r\n" + data + b"\r\n")
+
+
+def _matches(pattern: str, subject: str) -> bool:
+    p, s = pattern.split("."), subject.split(".")
+    for i, token in enumerate(p):
+        if token == ">":
+            return len(s) > i
+        if i >= len(s) or (token != "*" and token != s[i]):
+            return False
+    return len(p) == len(s)
+
+
+async def _legacy(url: str, n: int, payload: bytes):
+    from nats.aio.client import Client as NATS
+
+    for _ in range(n):
+        nc = NATS()
+        await nc.connect(url)
+        await nc.publish("bench.legacy", payload)
+        await nc.drain()
+
+
+async def _pooled_flush_each(client: NatsClientManager, n: int, payload: bytes):
+    for _ in range(n):
+        await client.publish("bench.pooled", payload, flush=True)
+
+
+async def _pooled_many(client: NatsClientManager, n: int, payload: bytes):
+    await client.publish_many(("bench.many", payload) for _ in range(n))
+
+
+async def _request_reply(client: NatsClientManager, n: int, payload: bytes):
+    for _ in range(n):
+        await client.request("bench.echo", payload)
+
+
+async def main_async(url: str, messages: int, legacy_messages: int, size: int):
+    standin = None
+    if url is None:
+        standin = StandInServer()
+        url = await standin.start()
+        print(f"in-process NATS stand-in at {url}")
+    payload = b"x" * size
+
+    async def timed(label, n, coro):
+        t0 = time.perf_counter()
+        await coro
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<32} {n:>7} msgs {elapsed:8.3f}s {n / elapsed:>12,.0f} msg/s")
+
+    client = NatsClientManager(url)
+    await client.connect()
+    await client.reply("bench.echo", lambda msg: msg.data)
+    await timed("connect per message (old)", legacy_messages, _legacy(url, legacy_messages, payload))
+    await timed("pooled, flush per message", messages, _pooled_flush_each(client, messages, payload))
+    await timed("pooled, publish_many", messages, _pooled_many(client, messages, payload))
+    await timed("request/reply", messages // 10, _request_reply(client, messages // 10, payload))
+    await client.close()
+    if standin is not None:
+        print(f"stand-in received {standin.received} messages")
+        await standin.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="NATS server (default: in-process stand-in)")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--legacy-messages", type=int, default=1000,
+                        help="messages for the connection-per-message path (it is slow)")
+    parser.add_argument("--size", type=int, default=128, help="payload bytes")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.url, args.messages, args.legacy_messages, args.size))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,45 @@ from orchestration import docker_manager,load_tester
 app = typer.Typer(help="Service orchestration commands")
 
 @app.command()
-def up(config: str = "services.yaml", rebuild: bool = typer.Option(False, "--rebuild", help="Rebuild images before starting")):
+def up(config: str = "services.yaml",
+       rebuild: bool = typer.Option(False, "--rebuild", help="Rebuild all images and restart every service"),
+       full: bool = typer.Option(False, "--full", help="Recreate every service, ignoring what is already running"),
+       wait: bool = typer.Option(True, "--wait/--no-wait", help="Block until every service answers its readiness probe"),
+       timeout: float = typer.Option(60.0, "--timeout", help="Seconds to wait for readiness")):
     """
     Spin up services from the given config file.
+
+    Only services added, removed or changed since the last `up` are touched;
+    mock images are rebuilt when their code or Dockerfile changed. With
+    --wait (the default) it then probes every service concurrently and
+    reports each one's time-to-ready, exiting 1 if any is not ready in time.
     """
     typer.echo(f"[UP] Generating docker-compose from {config}...")
     docker_manager.generate_compose(config)
-    docker_manager.compose_up(rebuild=rebuild)
+    diff = docker_manager.compose_up(rebuild=rebuild, full=full)
+    for key in ("added", "changed", "removed"):
+        if diff[key]:
+            typer.echo(f"[UP] {key}: {', '.join(diff[key])}")
+    if diff["rebuild"]:
+        typer.echo(f"[UP] rebuilt: {', '.join(diff['rebuild'])}")
+    if diff["unchanged"] and not (diff["added"] or diff["changed"] or diff["removed"]):
+        typer.echo("[UP] No config changes; started any stopped services.")
+    if not wait:
+        typer.echo("[UP] Services started (not waiting for readiness).")
+        return
+
+    import asyncio
+    import yaml
+    from orchestration import readiness
+
+    with open(config, "r") as f:
+        probes = readiness.probes_from_config(yaml.safe_load(f))
+    typer.echo(f"[UP] Waiting up to {timeout:.0f}s for {len(probes)} services...")
+    results = asyncio.run(readiness.wait_ready(probes, timeout, diff["started"]))
+    typer.echo(readiness.format_report(results))
+    if any(r.ready_s is None for r in results):
+        typer.echo("[UP] Some services are not ready.", err=True)
+        raise typer.Exit(code=1)
     typer.echo("[UP] Services are running!")
 
 @app.command()
@@ -46,9 +78,182 @@ def gen_compose(config: str = "services.yaml"):
     docker_manager.generate_compose(services)
 
 @app.command()
-def load(target: str, method: str = "GET", rps: int = 10, duration: int = 10, concurrency: int = 5):
+def load(target: str = typer.Argument(None, help="URL to hit (omit when using --scenario)"), method: str = "GET", rps: int = 10, duration: int = 10, concurrency: int = 5,
+         open_loop: bool = typer.Option(True, "--open-loop/--closed-loop", help="Schedule sends at fixed times and measure latency from the intended send time"),
+         json_out: str = typer.Option(None, "--json-out", help="Write the summary report as JSON to this file"),
+         processes: int = typer.Option(1, "--processes", help="Shard the target rate across this many worker processes"),
+         max_connections: int = typer.Option(None, "--max-connections", help="Connection pool size per process (default: concurrency)"),
+         max_keepalive: int = typer.Option(None, "--max-keepalive", help="Idle keep-alive connections kept per process"),
+         http2: bool = typer.Option(False, "--http2", help="Use HTTP/2 (requires httpx[http2])"),
+         timeout: float = typer.Option(10.0, "--timeout", help="Per-request timeout in seconds"),
+         scenario: str = typer.Option(None, "--scenario", help="Scenario file with weighted multi-step flows (rps = flows/s)"),
+         config: str = typer.Option("services.yaml", "--config", help="Services config used to resolve scenario targets"),
+         host: str = typer.Option("localhost", "--host", help="Host the mock ports are published on"),
+         profile: str = typer.Option(None, "--profile", help="Rate profile: constant:RPS, ramp:FROM:TO, steps:RPSxSECS,..., spike:BASE:PEAK:AT:LEN, soak:RPS"),
+         find_max: bool = typer.Option(False, "--find-max", help="Raise the rate from --rps until an SLO breaks and report the knee (--duration per stage)"),
+         max_rps: float = typer.Option(100000, "--max-rps", help="Upper bound for --find-max"),
+         slo_p99_ms: float = typer.Option(100.0, "--slo-p99-ms", help="p99 latency SLO for --find-max"),
+         slo_error_rate: float = typer.Option(0.01, "--slo-error-rate", help="Error-rate SLO for --find-max (0.01 = 1%)"),
+         record: str = typer.Option(None, "--record", help="Stream every raw sample to this file (.jsonl for JSON lines, else binary)"),
+         agents: str = typer.Option(None, "--agents", help="Comma-separated host:port load agents to drive instead of generating load here"),
+         agents_from_config: bool = typer.Option(False, "--agents-from-config", help="Use the load agents declared under load_agents in --config"),
+         live: bool = typer.Option(True, "--live/--no-live", help="Publish per-second stats for the dashboard over local UDP"),
+         live_port: int = typer.Option(9310, "--live-port", help="UDP port the dashboard listens on for live stats")):
     """
     Basic synthetic load runner.
     """
-    typer.echo(f"[load] starting {rps} rps to {target} for {duration}s")
-    load_tester.start_sync(target, method, rps, duration, concurrency)
\ No newline at end of file
+    from orchestration import load_profiles
+    opts = dict(max_connections=max_connections, max_keepalive=max_keepalive, http2=http2, timeout=timeout, record=record,
+                live=live_port if live else None)
+    if scenario:
+        from orchestration import scenarios
+        opts["scenario"] = scenarios.load_scenario(scenario, config, host)
+        typer.echo(f"[load] starting scenario {scenario} at {rps} flows/s for {duration}s")
+    elif target:
+        typer.echo(f"[load] starting {profile or f'{rps} rps'} to {target} for {duration}s")
+    else:
+        raise typer.BadParameter("give a TARGET url or --scenario")
+    if profile and not open_loop:
+        raise typer.BadParameter("--profile needs open-loop scheduling; drop --closed-loop")
+    if find_max and profile:
+        raise typer.BadParameter("--find-max picks its own rate per stage; it cannot be combined with --profile")
+    if find_max and (agents or agents_from_config):
+        raise typer.BadParameter("--find-max generates the load here; it cannot be combined with load agents")
+    if profile:
+        try:
+            opts["profile"] = load_profiles.parse_profile(profile, duration)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+
+    if find_max:
+        def on_stage(stage):
+            verdict = "ok" if stage["passed"] else f"FAIL ({stage['reason']})"
+            typer.echo(f"[load] {stage['rps']} rps -> {stage['throughput_rps']} rps, p99 {stage['latency_ms']['p99']} ms: {verdict}")
+        result = load_tester.find_max_throughput(target, method, rps, max_rps, stage_duration=duration, slo_p99_ms=slo_p99_ms,
+                                                 slo_error_rate=slo_error_rate, concurrency=concurrency, processes=processes,
+                                                 open_loop=open_loop, on_stage=on_stage, **opts)
+        typer.echo(f"[load] max throughput within SLO: {result['knee_rps']} rps (breaks at {result['first_failing_rps']}: {result['reason']})")
+        if json_out:
+            load_tester.write_summary(result, json_out)
+        return
+
+    if agents or agents_from_config:
+        import asyncio
+        from orchestration import load_agent
+        addresses = agents.split(",") if agents else load_agent.agent_addresses(config, host)
+        if not addresses:
+            raise typer.BadParameter(f"no load agents declared in {config}")
+        if scenario or record:
+            raise typer.BadParameter("--scenario and --record are not supported with load agents")
+        if processes > 1:
+            raise typer.BadParameter("--processes is not supported with load agents; each agent is one process, add agents instead")
+        typer.echo(f"[load] coordinating {len(addresses)} agents: {', '.join(addresses)}")
+        summary = asyncio.run(load_agent.run_distributed(addresses, target, method, rps, duration, concurrency, profile=profile,
+                                                         open_loop=open_loop, max_connections=max_connections, max_keepalive=max_keepalive,
+                                                         http2=http2, timeout=timeout))
+        typer.echo(load_tester.format_summary(summary))
+        if json_out:
+            load_tester.write_summary(summary, json_out)
+        return
+
+    summary = load_tester.start_sync(target, method, rps, duration, concurrency, open_loop=open_loop, processes=processes, **opts)
+    typer.echo(load_tester.format_summary(summary))
+    if json_out:
+        load_tester.write_summary(summary, json_out)
+        typer.echo(f"[load] summary written to {json_out}")
+    if record:
+        typer.echo(f"[load] raw samples written to {record}" + (".p*" if processes > 1 else ""))
+
+@app.command()
+def load_agent(port: int = 9100, host: str = "0.0.0.0"):
+    """
+    Run a load agent in this shell (what the load-agent-N containers run).
+    """
+    from orchestration import load_agent as agent
+    agent.run_agent(host, port)
+
+@app.command()
+def load_report(capture: str, json_out: str = typer.Option(None, "--json-out", help="Write the rebuilt report as JSON"),
+                timeseries: bool = typer.Option(True, "--timeseries/--no-timeseries", help="Print the per-second time series")):
+    """
+    Rebuild the latency report and per-second time series from a --record capture.
+    """
+    from orchestration import load_capture
+    report = load_capture.build_report(capture)
+    typer.echo(load_tester.format_summary(report))
+    if timeseries:
+        for row in report["timeseries"]:
+            typer.echo(f"[load]   t+{row['t']:>4}s  {row['requests']:>7} req  {row['errors']:>5} err"
+                       f"  p50 {row['p50_ms']:>9} ms  p99 {row['p99_ms']:>9} ms  max {row['max_ms']:>9} ms")
+    if json_out:
+        load_tester.write_summary(report, json_out)
+
+@app.command()
+def load_compare(baseline: str, candidate: str,
+                 latency_tolerance: float = typer.Option(0.10, "--latency-tolerance", help="Allowed relative growth of p50/p90/p99"),
+                 throughput_tolerance: float = typer.Option(0.05, "--throughput-tolerance", help="Allowed relative throughput drop"),
+                 error_tolerance: float = typer.Option(0.005, "--error-tolerance", help="Allowed absolute error-rate increase")):
+    """
+    Diff two runs (captures or --json-out summaries); exits 1 on a regression.
+    """
+    from orchestration import load_capture
+    try:
+        summaries = load_capture.load_summary(baseline), load_capture.load_summary(candidate)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    result = load_capture.compare(*summaries, latency_tolerance, throughput_tolerance, error_tolerance)
+    for row in result["rows"]:
+        change = f"{row['change']:+.1%}" if row["change"] is not None else "n/a"
+        flag = "REGRESSION" if row["regressed"] else "ok"
+        typer.echo(f"[compare] {row['metric']:<16} {row['baseline']:>10} -> {row['candidate']:>10} ({change:>8}) {flag}")
+    if result["regressions"]:
+        typer.echo(f"[compare] regressions: {', '.join(result['regressions'])}")
+        raise typer.Exit(code=1)
+    typer.echo("[compare] no regressions")
+
+@app.command()
+def metrics(collector: str = typer.Option("http://localhost:9090", "--collector", help="Metrics collector URL (metrics_collector in services.yaml)"),
+            window: float = typer.Option(60.0, "--window", help="Aggregate over the last N seconds"),
+            watch: float = typer.Option(0, "--watch", help="Re-query every N seconds until Ctrl-C"),
+            json_out: bool = typer.Option(False, "--json", help="Print the raw JSON instead of a table")):
+    """
+    Throughput and tail latency across all mocks, from the metrics collector.
+    """
+    import json
+    import time
+    from orchestration import metrics_collector
+    while True:
+        try:
+            result = metrics_collector.query(collector, window)
+        except Exception as e:
+            typer.echo(f"[metrics] collector at {collector} not reachable: {e}")
+            raise typer.Exit(code=1)
+        if json_out:
+            typer.echo(json.dumps(result, indent=2))
+        else:
+            typer.echo(f"[metrics] last {window:g}s")
+            rows = list(result["services"].items()) + [("TOTAL", result["total"])]
+            for name, s in rows:
+                if "rps" not in s:
+                    typer.echo(f"[metrics] {name:<20} {'up' if s.get('up') else 'DOWN':>5}  (no data yet)")
+                    continue
+                lat = s["latency_ms"]
+                state = "" if name == "TOTAL" else ("up" if s["up"] else "DOWN")
+                typer.echo(f"[metrics] {name:<20} {state:>5} {s['rps']:>9} rps  err {s['error_rate']:>7.2%}"
+                           f"  p50 {lat['p50']:>8} ms  p90 {lat['p90']:>8} ms  p99 {lat['p99']:>8} ms"
+                           f"  in-flight {s['in_flight']:>4}")
+        if not watch:
+            break
+        time.sleep(watch)
+
+@app.command()
+def dashboard(compose_file: str = typer.Option("docker-compose.generated.yml", "--compose-file", help="Generated compose file whose services to show"),
+              project: str = typer.Option(None, "--project", help="Compose project name (default: the compose file's directory)"),
+              collector: str = typer.Option(None, "--collector", help="Metrics collector URL for rps/error/p99 columns"),
+              service: str = typer.Option(None, "--service", help="Show this service's logs instead of the merged tail"),
+              live_port: int = typer.Option(9310, "--live-port", help="UDP port for live stats from 'services load' (0 to disable)")):
+    """
+    Live status, logs and metrics for every service (Ctrl-C to quit).
+    """
+    from dashboard import tui
+    tui.run_tui(compose_file, project, collector, service, live_port)
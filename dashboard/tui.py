@@ -1,59 +1,349 @@
 # dashboard/tui.py
-import subprocess
+"""
+Live dashboard for a stitched environment, driven by the Docker SDK.
+
+Instead of polling `docker compose ps/logs`, one thread follows the Docker
+event stream for the compose project and one thread per running container
+follows its log stream. They update per-service rows (state, health,
+restarts, last log line) and bounded log buffers and mark the view dirty;
+the screen is only redrawn when something changed, from rows whose cells
+were already formatted when their service changed. An optional metrics
+collector (see orchestration/metrics_collector.py) adds rps/error/p99
+columns with one query per refresh, however many services there are.
+
+Running containers also get a Docker stats stream each (CPU / memory
+sparklines), and a running `services load` shows up as a live panel fed by
+its per-second UDP stats (orchestration/live_stats.py). Every history is a
+fixed-length deque.
+"""
 import threading
 import time
+from collections import deque
+
+import yaml
+from rich.console import Console, Group
 from rich.live import Live
-from rich.table import Table
 from rich.panel import Panel
-from rich.console import Console
+from rich.table import Table
+from rich.text import Text
+
+from orchestration.docker_manager import compose_project
 
 console = Console()
 
-def docker_ps(compose_file="docker-compose.generated.yml"):
-    cmd = ["docker", "compose", "-f", compose_file, "ps", "--format", "json"]
+LOG_LINES_PER_SERVICE = 200
+LOG_PANEL_LINES = 15
+MAX_REDRAWS_PER_SECOND = 4
+METRICS_POLL_S = 2.0
+STATS_HISTORY = 30  # samples of CPU/memory kept per container (~1 per second)
+SPARK_WIDTH = 20
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+STATE_STYLES = {"running": "green", "restarting": "yellow", "exited": "red", "dead": "red", "created": "dim"}
+
+
+def sparkline(values, width: int = SPARK_WIDTH, top: float = None) -> str:
+    values = list(values)[-width:]
+    if not values:
+        return ""
+    top = top or max(values) or 1.0
+    last = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[min(last, int(v / top * last + 0.5))] for v in values)
+
+
+def compose_services(compose_file: str) -> list:
+    with open(compose_file, "r") as f:
+        return list((yaml.safe_load(f) or {}).get("services", {}))
+
+
+class ServiceRow:
+    def __init__(self, name: str):
+        self.name = name
+        self.container_id = None
+        self.state = "absent"
+        self.health = ""
+        self.restarts = 0
+        self.started_at = None
+        self.last_log = ""
+        self.logs = deque(maxlen=LOG_LINES_PER_SERVICE)
+        self.metrics = None
+        self.cpu = deque(maxlen=STATS_HISTORY)  # percent of one core
+        self.mem = deque(maxlen=STATS_HISTORY)  # MiB
+        self.cells = ()
+        self.refresh_cells()
+
+    def refresh_cells(self):
+        """Re-format this row; called only when one of its fields changed."""
+        up = ""
+        if self.state == "running" and self.started_at:
+            secs = int(time.time() - self.started_at)
+            up = f"{secs // 3600}h{secs % 3600 // 60:02d}m" if secs >= 3600 else f"{secs // 60}m{secs % 60:02d}s"
+        m = self.metrics or {}
+        lat = m.get("latency_ms") or {}
+        self.cells = (
+            self.name,
+            Text(self.state, style=STATE_STYLES.get(self.state, "")),
+            self.health,
+            up,
+            str(self.restarts),
+            f"{sparkline(self.cpu, 10, 100.0)} {self.cpu[-1]:5.1f}%" if self.cpu and self.state == "running" else "",
+            f"{sparkline(self.mem, 10)} {self.mem[-1]:6.1f}M" if self.mem and self.state == "running" else "",
+            f"{m['rps']:.1f}" if "rps" in m else "",
+            f"{m['error_rate']:.1%}" if "error_rate" in m else "",
+            f"{lat['p99']:.1f}" if "p99" in lat else "",
+            Text(self.last_log[-80:], overflow="ellipsis", no_wrap=True),
+        )
+
+
+class Dashboard:
+    def __init__(self, compose_file: str = "docker-compose.generated.yml", project: str = None,
+                 collector: str = None, focus: str = None, live_port: int = None):
+        import docker
+
+        self.client = docker.from_env()
+        self.project = project or compose_project(compose_file)
+        self.rows = {name: ServiceRow(name) for name in compose_services(compose_file)}
+        self.collector = collector
+        self.focus = focus
+        self.recent_logs = deque(maxlen=LOG_PANEL_LINES)  # (service, line) across services
+        self.lock = threading.Lock()
+        self.dirty = threading.Event()
+        self.stop = threading.Event()
+        self.followers = {}  # (container id, started at) -> log thread
+        self.stat_streams = {}  # (container id, started at) -> stats thread
+        self.events = None
+        self.live = None
+        if live_port:
+            from orchestration.live_stats import LiveListener
+
+            try:
+                self.live = LiveListener(live_port)
+                self.live.on_update = self.dirty.set
+            except OSError as e:
+                console.print(f"[dashboard] live load stats disabled, port {live_port}: {e}")
+
+    # ---- state updates (called from the event/log/metrics threads) ----
+    def _row_for(self, container) -> ServiceRow:
+        labels = container.labels if hasattr(container, "labels") else container
+        name = labels.get("com.docker.compose.service")
+        if name is None:
+            return None
+        row = self.rows.get(name)
+        if row is None:
+            with self.lock:
+                row = self.rows.setdefault(name, ServiceRow(name))
+        return row
+
+    def _sync(self, container):
+        """Refresh one service's row from a container's inspect data."""
+        container.reload()
+        row = self._row_for(container)
+        if row is None:
+            return
+        attrs = container.attrs
+        state = attrs.get("State", {})
+        with self.lock:
+            row.container_id = container.id
+            row.state = state.get("Status", container.status)
+            row.health = (state.get("Health") or {}).get("Status", "")
+            row.restarts = attrs.get("RestartCount", 0)
+            started = state.get("StartedAt", "")
+            row.started_at = _parse_docker_time(started) if row.state == "running" else None
+            row.refresh_cells()
+        self.dirty.set()
+        if row.state == "running":
+            self._follow_logs(container, row, started)
+            self._follow_stats(container, row, started)
+
+    def _follow_logs(self, container, row: ServiceRow, started: str):
+        # one follower per container run: a restart ends the old stream
+        key = (container.id, started)
+        if key in self.followers:
+            return
+
+        def follow():
+            try:
+                for chunk in container.logs(stream=True, follow=True, tail=LOG_LINES_PER_SERVICE if not row.logs else 0):
+                    if self.stop.is_set():
+                        break
+                    for line in chunk.decode(errors="replace").splitlines():
+                        with self.lock:
+                            row.logs.append(line)
+                            self.recent_logs.append((row.name, line))
+                            row.last_log = line
+                            row.refresh_cells()
+                        self.dirty.set()
+            except Exception:
+                pass  # container went away; the event stream reports it
+
+        thread = threading.Thread(target=follow, daemon=True, name=f"logs-{row.name}")
+        self.followers[key] = thread
+        thread.start()
+
+    def _follow_stats(self, container, row: ServiceRow, started: str):
+        key = (container.id, started)
+        if key in self.stat_streams:
+            return
+
+        def follow():
+            try:
+                for s in container.stats(stream=True, decode=True):
+                    if self.stop.is_set():
+                        break
+                    cpu, mem = _cpu_percent(s), _mem_mib(s)
+                    with self.lock:
+                        if cpu is not None:
+                            row.cpu.append(cpu)
+                        if mem is not None:
+                            row.mem.append(mem)
+                        row.refresh_cells()
+                    self.dirty.set()
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=follow, daemon=True, name=f"stats-{row.name}")
+        self.stat_streams[key] = thread
+        thread.start()
+
+    def _watch_events(self):
+        filters = {"type": "container", "label": f"com.docker.compose.project={self.project}"}
+        self.events = self.client.events(decode=True, filters=filters)
+        for event in self.events:
+            if self.stop.is_set():
+                break
+            action = event.get("Action", event.get("status", ""))
+            attributes = event.get("Actor", {}).get("Attributes", {})
+            row = self._row_for(attributes)
+            if row is None:
+                continue
+            if action == "destroy":
+                with self.lock:
+                    row.state, row.health, row.started_at, row.container_id = "absent", "", None, None
+                    row.refresh_cells()
+                self.dirty.set()
+                continue
+            if action.startswith("exec_"):
+                continue
+            try:
+                self._sync(self.client.containers.get(event["Actor"]["ID"]))
+            except Exception:
+                pass
+
+    def _poll_metrics(self):
+        from orchestration import metrics_collector
+
+        while not self.stop.wait(METRICS_POLL_S):
+            try:
+                result = metrics_collector.query(self.collector, window_s=10)
+            except Exception:
+                continue
+            with self.lock:
+                for name, stats in result["services"].items():
+                    row = self.rows.get(name)
+                    if row is not None:
+                        row.metrics = stats
+                        row.refresh_cells()
+            self.dirty.set()
+
+    # ---- rendering ----
+    def render(self):
+        with self.lock:
+            table = Table(title=f"ServiceStitch - {self.project}", expand=True)
+            for col, kw in (("Service", {}), ("State", {}), ("Health", {}), ("Up", {"justify": "right"}),
+                            ("Restarts", {"justify": "right"}), ("CPU", {}), ("Mem", {}),
+                            ("rps", {"justify": "right"}),
+                            ("err", {"justify": "right"}), ("p99 ms", {"justify": "right"}),
+                            ("Last log", {"ratio": 1})):
+                table.add_column(col, **kw)
+            for row in self.rows.values():
+                table.add_row(*row.cells)
+            if self.focus and self.focus in self.rows:
+                lines = [Text(line, no_wrap=True) for line in list(self.rows[self.focus].logs)[-LOG_PANEL_LINES:]]
+                title = f"{self.focus} logs"
+            else:
+                lines = [Text.assemble((f"{svc:<12} ", "cyan"), line) for svc, line in self.recent_logs]
+                title = "recent logs"
+        parts = [table]
+        load = self.live.series() if self.live is not None else {}
+        if load:
+            parts.append(self._render_load(load))
+        parts.append(Panel(Group(*lines), title=title))
+        return Group(*parts)
+
+    def _render_load(self, load: dict):
+        table = Table(expand=True, box=None)
+        for col in ("Load target", "rps", "", "p50 ms", "p99 ms", "", "errors/s"):
+            table.add_column(col, justify="right" if col not in ("Load target", "") else "left")
+        for target, cols in load.items():
+            table.add_row(target, str(cols["rps"][-1]), sparkline(cols["rps"]), f"{cols['p50_ms'][-1]:.1f}",
+                          f"{cols['p99_ms'][-1]:.1f}", sparkline(cols["p99_ms"]), str(cols["errors"][-1]))
+        return Panel(table, title="live load (per second)")
+
+    def run(self):
+        for container in self.client.containers.list(
+                all=True, filters={"label": f"com.docker.compose.project={self.project}"}):
+            self._sync(container)
+        threading.Thread(target=self._watch_events, daemon=True, name="docker-events").start()
+        if self.collector:
+            threading.Thread(target=self._poll_metrics, daemon=True, name="metrics").start()
+
+        with Live(self.render(), console=console, auto_refresh=False, screen=False) as live:
+            try:
+                while True:
+                    # redraw only after something changed, at a bounded rate;
+                    # the timeout keeps the Up column ticking when idle
+                    changed = self.dirty.wait(timeout=5.0)
+                    self.dirty.clear()
+                    if not changed:
+                        with self.lock:
+                            for row in self.rows.values():
+                                if row.state == "running":
+                                    row.refresh_cells()
+                    live.update(self.render(), refresh=True)
+                    time.sleep(1.0 / MAX_REDRAWS_PER_SECOND)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.stop.set()
+                if self.events is not None:
+                    self.events.close()
+                if self.live is not None:
+                    self.live.close()
+                self.client.close()
+
+
+def _parse_docker_time(value: str):
+    # "2024-05-01T12:34:56.123456789Z" -> epoch seconds
+    from datetime import datetime, timezone
+
+    if not value or value.startswith("0001"):
+        return None
     try:
-        out = subprocess.check_output(cmd)
-        # if the docker CLI doesn't support json on older versions, fall back
-        s = out.decode()
-        # naive parse: show the raw text
-        return s
-    except Exception:
-        # fallback: use `docker ps`
-        try:
-            out = subprocess.check_output(["docker", "ps", "--format", "{{.Names}} {{.Status}}"])
-            return out.decode()
-        except Exception as e:
-            return f"error: {e}"
-
-def tail_logs(service_name, compose_file="docker-compose.generated.yml", stop_event=None):
-    cmd = ["docker", "compose", "-f", compose_file, "logs", "--no-color", "--tail", "20", service_name]
+        return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def _cpu_percent(s: dict):
+    """CPU use since the previous stats sample, in percent of one core."""
+    cpu, pre = s.get("cpu_stats") or {}, s.get("precpu_stats") or {}
     try:
-        out = subprocess.check_output(cmd)
-        return out.decode()
-    except Exception as e:
-        return f"error: {e}"
-
-def build_table(ps_text: str):
-    t = Table(title="Service Status")
-    t.add_column("Name / Raw")
-    t.add_row(ps_text)
-    return t
-
-def run_tui(compose_file="docker-compose.generated.yml"):
-    stop = threading.Event()
-    def refresh():
-        while not stop.is_set():
-            time.sleep(2)
-    th = threading.Thread(target=refresh, daemon=True)
-    th.start()
-    with Live(console=console, refresh_per_second=1) as live:
-        try:
-            while True:
-                ps_text = docker_ps(compose_file)
-                table = build_table(ps_text)
-                logs = tail_logs("mock-user", compose_file)
-                live.update(Panel(table))
-                console.print(Panel(logs, title="mock-user logs"))
-                time.sleep(2)
-        except KeyboardInterrupt:
-            stop.set()
+        cpu_delta = cpu["cpu_usage"]["total_usage"] - pre["cpu_usage"]["total_usage"]
+        system_delta = cpu["system_cpu_usage"] - pre["system_cpu_usage"]
+    except KeyError:
+        return None
+    online = cpu.get("online_cpus") or len(cpu["cpu_usage"].get("percpu_usage") or [1])
+    return cpu_delta / system_delta * online * 100.0 if system_delta > 0 else 0.0
+
+
+def _mem_mib(s: dict):
+    mem = s.get("memory_stats") or {}
+    if "usage" not in mem:
+        return None
+    # like `docker stats`: page cache that can be reclaimed is not counted
+    cache = (mem.get("stats") or {}).get("inactive_file", 0)
+    return (mem["usage"] - cache) / (1024 * 1024)
+
+
+def run_tui(compose_file="docker-compose.generated.yml", project: str = None, collector: str = None,
+            focus: str = None, live_port: int = None):
+    Dashboard(compose_file, project, collector, focus, live_port).run()
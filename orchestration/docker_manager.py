@@ -1,9 +1,25 @@
+import hashlib
 import json
+import re
 import subprocess
+import time
 import yaml
 from pathlib import Path
 
+from orchestration.mock_config import check_host_group
+from orchestration.mock_metrics import DEFAULT_METRICS_PATH, check_reserved_paths
+
 COMPOSE_FILE = Path("docker-compose.generated.yml")
+# fingerprints of what the last successful compose_up started
+STATE_FILE = Path(".servicestitch-state.json")
+# one JSON config per mock, bind-mounted into the shared mock image
+MOCK_CONFIG_DIR = Path(".servicestitch/mocks")
+MOCK_CONFIG_PATH = "/etc/servicestitch/mock.json"
+MOCK_HOST_CONFIG_PATH = "/etc/servicestitch/host.json"
+# tagged with a hash of its build inputs, so it is built once and reused by every mock
+MOCK_IMAGE = "servicestitch-mock"
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+MOCK_BUILD = {"context": str(PROJECT_ROOT), "dockerfile": "orchestration/Dockerfile.mock"}
 
 def generate_compose(config_file: str = "services.yaml") -> None:
     """Generate docker-compose file from a YAML config, including mocks."""
@@ -15,31 +31,37 @@ def generate_compose(config_file: str = "services.yaml") -> None:
     compose_dict = {
         "services": {}
     }
+    mock_image = None
+    mock_configs = set()
+    hosts_cfg = cfg.get("mock_hosts") or {}
+    hosted = {}  # host group -> [(name, spec)]
 
     for name, spec in services_cfg.items():
         service_def = {}
 
-        # If service is a mock, build from Dockerfile
-        if spec.get("type") == "mock":
-            # Use orchestration folder as build context
-            service_def["build"] = {
-                "context": str(Path(__file__).parent.parent.resolve()),  # project root
-                "dockerfile": "orchestration/Dockerfile.mock"
-            }
+        if spec.get("type") == "mock" and mock_image is None:
+            mock_image = f"{MOCK_IMAGE}:{_build_inputs_hash(MOCK_BUILD, {})[:12]}"
 
-            # Inject endpoints as JSON string
-            import json
-            endpoints = spec.get("endpoints", [])
-            
-            # Start with MOCK_ENDPOINTS
-            env_vars = [f"MOCK_ENDPOINTS={json.dumps(endpoints)}"]
+        # Mocks in a host group are served together by one mock_host container below
+        if spec.get("type") == "mock" and spec.get("host"):
+            hosted.setdefault(spec["host"], []).append((name, spec))
+            continue
 
-            # Add NATS subscriptions if any
-            nats_subscribe = spec.get("nats_subscribe", [])
-            if nats_subscribe:
-                env_vars.append(f"NATS_SUBSCRIBE={json.dumps(nats_subscribe)}")
+        # If service is a mock, run the shared mock image with its own config file
+        if spec.get("type") == "mock":
+            mock_config = mock_service_config(name, spec)
+            config_path = _write_if_changed(MOCK_CONFIG_DIR / f"{name}.json", json.dumps(mock_config, indent=2))
+            mock_configs.add(config_path.name)
 
-            service_def["environment"] = env_vars
+            service_def["image"] = mock_image
+            service_def["volumes"] = [f"{config_path.resolve()}:{MOCK_CONFIG_PATH}:ro"]
+            service_def["environment"] = [f"MOCK_CONFIG={MOCK_CONFIG_PATH}"]
+            # the mounted file's content is not part of the definition; the label
+            # makes compose (and compose_up's fingerprints) see config changes
+            service_def["labels"] = {
+                "servicestitch.config-sha": hashlib.sha256(config_path.read_bytes()).hexdigest()[:16],
+            }
+            service_def["command"] = mock_server_command(spec)
             
             # Map port
             port = spec.get("port", 8000)
@@ -55,6 +77,69 @@ def generate_compose(config_file: str = "services.yaml") -> None:
 
         compose_dict["services"][name] = service_def
 
+    for group, members in hosted.items():
+        if group in services_cfg:
+            raise ValueError(f"host group {group!r} has the same name as a service")
+        host_cfg = hosts_cfg.get(group) or {}
+        host_config = mock_host_config(group, members, host_cfg)
+        config_path = _write_if_changed(MOCK_CONFIG_DIR / f"{group}.host.json", json.dumps(host_config, indent=2))
+        mock_configs.add(config_path.name)
+        if host_config["routing"] == "port":
+            ports = [f"{svc['port']}:{svc['port']}" for svc in host_config["services"]]
+        else:
+            ports = [f"{host_cfg.get('port', 8000)}:80"]
+        compose_dict["services"][group] = {
+            "image": mock_image,
+            "volumes": [f"{config_path.resolve()}:{MOCK_HOST_CONFIG_PATH}:ro"],
+            "environment": [f"MOCK_HOST_CONFIG={MOCK_HOST_CONFIG_PATH}"],
+            "labels": {"servicestitch.config-sha": hashlib.sha256(config_path.read_bytes()).hexdigest()[:16]},
+            "command": mock_host_command(host_cfg),
+            "ports": ports,
+            # hosted mocks stay reachable by their own names inside the network
+            "networks": {"default": {"aliases": [name for name, _ in members]}},
+        }
+
+    # Optional distributed load agents (driven by load_agent.run_distributed)
+    agents_cfg = cfg.get("load_agents") or {}
+    base_port = agents_cfg.get("port", 9100)
+    for i in range(agents_cfg.get("count", 0)):
+        compose_dict["services"][f"load-agent-{i}"] = {
+            "build": {
+                "context": str(Path(__file__).parent.parent.resolve()),
+                "dockerfile": "orchestration/Dockerfile.agent"
+            },
+            "command": ["python", "-m", "orchestration.load_agent", "--port", "9100", "--name", f"load-agent-{i}"],
+            "ports": [f"{base_port + i}:9100"],
+        }
+
+    # Optional central metrics collector scraping every mock's /metrics
+    collector_cfg = cfg.get("metrics_collector")
+    if collector_cfg:
+        collector_cfg = {} if collector_cfg is True else collector_cfg
+        targets = {
+            name: mock_address(name, spec, hosts_cfg)[0] + spec.get("metrics_path", DEFAULT_METRICS_PATH)
+            for name, spec in services_cfg.items() if spec.get("type") == "mock"
+        }
+        compose_dict["services"]["metrics-collector"] = {
+            "build": {
+                "context": str(Path(__file__).parent.parent.resolve()),
+                "dockerfile": "orchestration/Dockerfile.collector"
+            },
+            "environment": [
+                f"COLLECTOR_TARGETS={json.dumps(targets)}",
+                f"COLLECTOR_INTERVAL_S={collector_cfg.get('interval_s', 1)}",
+                f"COLLECTOR_RETENTION={collector_cfg.get('retention', 900)}",
+            ],
+            "ports": [f"{collector_cfg.get('port', 9090)}:9090"],
+        }
+
+    if mock_image is not None:
+        # compose ignores x- keys; compose_up builds the image from this if it is missing
+        compose_dict["x-servicestitch"] = {"mock_image": {"tag": mock_image, **MOCK_BUILD}}
+    for stale in MOCK_CONFIG_DIR.glob("*.json"):
+        if stale.name not in mock_configs:
+            stale.unlink()
+
     # Write the generated docker-compose
     with open(COMPOSE_FILE, "w") as f:
         yaml.dump(compose_dict, f, sort_keys=False)
@@ -63,16 +148,250 @@ def generate_compose(config_file: str = "services.yaml") -> None:
 
 
 
-def compose_up(detach: bool = True, rebuild: bool = False) -> None:
-    cmd = ["docker", "compose", "-f", str(COMPOSE_FILE), "up"]
+def mock_service_config(name: str, spec: dict) -> dict:
+    """The config file a mock reads at startup (see mock_service.config_from_env)."""
+    endpoints = spec.get("endpoints", [])
+    metrics_path = spec.get("metrics_path", DEFAULT_METRICS_PATH)
+    check_reserved_paths(endpoints, metrics_path, name)
+    config = {
+        "service": name,
+        "workers": int(spec.get("workers", 1)),
+        "endpoints": endpoints,
+        "nats_subscribe": spec.get("nats_subscribe", []),
+        "metrics_path": metrics_path,
+        "tracing": spec.get("tracing", True) is not False,
+    }
+    if "nats_concurrency" in spec:
+        config["nats_concurrency"] = int(spec["nats_concurrency"])
+    if spec.get("nats_publisher"):
+        config["nats_publisher"] = spec["nats_publisher"]
+    return config
+
+
+def mock_host_config(group: str, members: list, host_cfg: dict) -> dict:
+    """The config file mock_host reads: the group's routing plus each member's mock config."""
+    routing = host_cfg.get("routing", "port")
+    services = [{**mock_service_config(name, spec), "port": int(spec.get("port", 8000))} for name, spec in members]
+    check_host_group(group, services, routing)
+    return {"host": group, "routing": routing, "services": services}
+
+
+def mock_address(name: str, spec: dict, hosts_cfg: dict, published_on: str = None) -> tuple:
+    """
+    (base URL, extra headers) of a mock, honouring its host group's routing.
+    From inside the compose network by default, or through the ports
+    published on `published_on` (e.g. "localhost") for clients on the host.
+    """
+    group = spec.get("host")
+    host_cfg = (hosts_cfg.get(group) or {}) if group else {}
+    routing = host_cfg.get("routing", "port")
+    if published_on is None:
+        if not group:
+            return f"http://{name}:80", {}
+        if routing == "port":
+            return f"http://{name}:{int(spec.get('port', 8000))}", {}
+        if routing == "path":
+            return f"http://{group}:80/{name}", {}
+        return f"http://{name}:80", {}  # host routing: the network alias is the Host header
+    if not group or routing == "port":
+        return f"http://{published_on}:{int(spec.get('port', 8000))}", {}
+    shared = f"http://{published_on}:{int(host_cfg.get('port', 8000))}"
+    if routing == "path":
+        return f"{shared}/{name}", {}
+    return shared, {"host": name}
+
+
+def _write_if_changed(path: Path, text: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists() or path.read_text() != text:
+        path.write_text(text)
+    return path
+
+
+MOCK_LOOPS = ("auto", "asyncio", "uvloop")
+MOCK_HTTP_PARSERS = ("auto", "h11", "httptools")
+
+
+def mock_server_command(spec: dict, app_path: str = "orchestration.mock_service:create_app") -> list:
+    """uvicorn command line for a mock, honouring its workers/loop/http settings."""
+    workers = int(spec.get("workers", 1))
+    loop = spec.get("loop", "auto")
+    http = spec.get("http", "auto")
+    if workers < 1:
+        raise ValueError(f"workers must be >= 1, got {workers}")
+    if loop not in MOCK_LOOPS:
+        raise ValueError(f"loop must be one of {MOCK_LOOPS}, got {loop!r}")
+    if http not in MOCK_HTTP_PARSERS:
+        raise ValueError(f"http must be one of {MOCK_HTTP_PARSERS}, got {http!r}")
+    cmd = ["uvicorn", "--factory", app_path, "--host", "0.0.0.0", "--port", "80", "--loop", loop, "--http", http]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    if not spec.get("access_log", True):
+        cmd.append("--no-access-log")
+    return cmd
+
+
+def mock_host_command(host_cfg: dict) -> list:
+    """Command line for a mock_host container (one process, so no workers)."""
+    loop = host_cfg.get("loop", "auto")
+    http = host_cfg.get("http", "auto")
+    if loop not in MOCK_LOOPS:
+        raise ValueError(f"loop must be one of {MOCK_LOOPS}, got {loop!r}")
+    if http not in MOCK_HTTP_PARSERS:
+        raise ValueError(f"http must be one of {MOCK_HTTP_PARSERS}, got {http!r}")
+    cmd = ["python", "-m", "orchestration.mock_host", "--loop", loop, "--http", http]
+    if not host_cfg.get("access_log", True):
+        cmd.append("--no-access-log")
+    return cmd
+
+
+def _build_inputs_hash(build: dict, cache: dict) -> str:
+    """Hash of the Dockerfile plus the orchestration sources every image copies in."""
+    key = (build["context"], build["dockerfile"])
+    if key not in cache:
+        context = Path(build["context"])
+        h = hashlib.sha256()
+        files = [context / build["dockerfile"]]
+        files += sorted(p for p in (context / "orchestration").rglob("*")
+                        if p.is_file() and "__pycache__" not in p.parts)
+        for path in files:
+            h.update(str(path.relative_to(context)).encode() + b"\0")
+            h.update(path.read_bytes())
+        cache[key] = h.hexdigest()
+    return cache[key]
+
+
+def service_fingerprints(compose_dict: dict) -> dict:
+    """
+    {service: {"definition": sha256, "build": sha256 or None}} for a generated
+    compose dict. "definition" covers the resolved service (env, command,
+    ports, image); "build" the inputs of its image, for services built locally.
+    """
+    cache = {}
+    out = {}
+    for name, service_def in compose_dict.get("services", {}).items():
+        blob = json.dumps(service_def, sort_keys=True, separators=(",", ":")).encode()
+        out[name] = {
+            "definition": hashlib.sha256(blob).hexdigest(),
+            "build": _build_inputs_hash(service_def["build"], cache) if "build" in service_def else None,
+        }
+    return out
+
+
+def load_state() -> dict:
+    try:
+        with open(STATE_FILE, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get("compose_file") != str(COMPOSE_FILE.resolve()):
+        return {}
+    return state.get("services", {})
+
+
+def save_state(fingerprints: dict) -> None:
+    with open(STATE_FILE, "w") as f:
+        json.dump({"compose_file": str(COMPOSE_FILE.resolve()), "services": fingerprints}, f, indent=2)
+
+
+def diff_services(previous: dict, current: dict) -> dict:
+    """Split services into added/changed/removed/unchanged; "rebuild" lists changed images."""
+    changed = [n for n in current if n in previous and current[n] != previous[n]]
+    return {
+        "added": [n for n in current if n not in previous],
+        "changed": changed,
+        "removed": [n for n in previous if n not in current],
+        "unchanged": [n for n in current if n in previous and current[n] == previous[n]],
+        "rebuild": [n for n in changed if current[n]["build"] and current[n]["build"] != previous[n]["build"]],
+    }
+
+
+def compose_project(compose_file=COMPOSE_FILE) -> str:
+    """Compose's default project name: the compose file's directory, normalized."""
+    name = Path(compose_file).resolve().parent.name.lower()
+    return re.sub(r"[^a-z0-9_-]", "", name)
+
+
+def _remove_services(names: list) -> None:
+    """Stop and remove the containers of services no longer in the compose file."""
+    project = compose_project()
+    for name in names:
+        ids = subprocess.run(
+            ["docker", "ps", "-aq",
+             "--filter", f"label=com.docker.compose.project={project}",
+             "--filter", f"label=com.docker.compose.service={name}"],
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+        if ids:
+            subprocess.run(["docker", "rm", "-f", *ids], check=True)
+
+
+def ensure_image(image: dict, rebuild: bool = False) -> None:
+    """Build {tag, context, dockerfile} unless an image with that tag already exists."""
+    exists = subprocess.run(["docker", "image", "inspect", image["tag"]], capture_output=True).returncode == 0
+    if exists and not rebuild:
+        return
+    print(f"[docker_manager] Building {image['tag']}")
+    subprocess.run(["docker", "build", "-t", image["tag"], "-f", image["dockerfile"], image["context"]],
+                   check=True, cwd=image["context"])
+
+
+def compose_up(detach: bool = True, rebuild: bool = False, full: bool = False) -> dict:
+    """
+    Bring the generated stack up, recreating only services whose fingerprint
+    differs from the last successful run: removed services are stopped,
+    added/changed ones are force-recreated with --no-deps, and images are
+    rebuilt only when their build inputs changed. Unchanged services still go
+    through `up`, so stopped or lost containers come back (compose leaves
+    running, unchanged ones alone). `rebuild` rebuilds every image and
+    recreates everything, `full` recreates everything without rebuilding.
+    Returns the diff that was applied, plus "started": the time.perf_counter()
+    after all image builds, when the containers began to be (re)started.
+    """
+    with open(COMPOSE_FILE, "r") as f:
+        compose_dict = yaml.safe_load(f) or {}
+    current = service_fingerprints(compose_dict)
+    previous = {} if (rebuild or full) else load_state()
+    mock_image = compose_dict.get("x-servicestitch", {}).get("mock_image")
+    if mock_image:
+        ensure_image(mock_image, rebuild)
+    base = ["docker", "compose", "-f", str(COMPOSE_FILE)]
+
+    if not previous:
+        if rebuild:
+            # built separately, so `started` does not include build time
+            subprocess.run(base + ["build"], check=True)
+        started = time.perf_counter()
+        cmd = base + ["up", "--remove-orphans"]
+        if detach:
+            cmd.append("-d")
+        if rebuild or full:
+            cmd.append("--force-recreate")
+        subprocess.run(cmd, check=True)
+        save_state(current)
+        return {"added": list(current), "changed": [], "removed": [], "unchanged": [], "rebuild": [],
+                "started": started}
+
+    diff = diff_services(previous, current)
+    if diff["rebuild"]:
+        subprocess.run(base + ["build", *diff["rebuild"]], check=True)
+    diff["started"] = time.perf_counter()
+    if diff["removed"]:
+        _remove_services(diff["removed"])
+    touched = diff["added"] + diff["changed"]
+    if touched:
+        subprocess.run(base + ["up", "-d", "--no-deps", "--force-recreate", *touched], check=True)
+    # everything else: starts whatever is stopped or missing, a no-op for running containers
+    cmd = base + ["up", "--no-deps"]
     if detach:
         cmd.append("-d")
-    if rebuild:
-        cmd.append("--build")  # This ensures images are rebuilt
-    subprocess.run(cmd, check=True)
+    subprocess.run(cmd + list(current), check=True)
+    save_state(current)
+    return diff
 
 
 def compose_down() -> None:
     """Run docker compose down."""
     cmd = ["docker", "compose", "-f", str(COMPOSE_FILE), "down"]
     subprocess.run(cmd, check=True)
+    STATE_FILE.unlink(missing_ok=True)
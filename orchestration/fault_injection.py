@@ -1,10 +1,82 @@
 # orchestration/fault_injection.py
+import asyncio
+import bisect
+import math
 import random
-import time
 
-def maybe_delay(latency_ms: int):
+# z-score of the 99th percentile of a standard normal
+Z_P99 = 2.326
+
+
+def compile_latency(spec):
+    """
+    Turn an endpoint's `delay` spec into a zero-arg sampler returning ms
+    (or None when there is no delay). Accepted forms:
+
+        delay: 200                                          # fixed
+        delay: {distribution: fixed, value: 200}
+        delay: {distribution: uniform, min: 50, max: 150}
+        delay: {distribution: normal, mean: 100, stddev: 20}
+        delay: {distribution: lognormal, median: 40, sigma: 0.5}
+        delay: {distribution: lognormal, median: 40, p99: 300}
+        delay: {p50: 20, p90: 80, p99: 250, max: 400}       # percentile table
+    """
+    if not spec:
+        return None
+    if isinstance(spec, (int, float)):
+        value = float(spec)
+        return lambda: value
+
+    kind = spec.get("distribution")
+    if kind is None and any(_is_percentile(k) for k in spec):
+        kind = "percentiles"
+
+    if kind == "fixed":
+        value = float(spec["value"])
+        return lambda: value
+    if kind == "uniform":
+        lo, hi = float(spec["min"]), float(spec["max"])
+        return lambda: random.uniform(lo, hi)
+    if kind == "normal":
+        mean, stddev = float(spec["mean"]), float(spec["stddev"])
+        return lambda: max(0.0, random.gauss(mean, stddev))
+    if kind == "lognormal":
+        median = float(spec["median"])
+        if "sigma" in spec:
+            sigma = float(spec["sigma"])
+        else:
+            sigma = math.log(float(spec["p99"]) / median) / Z_P99
+        mu = math.log(median)
+        cap = float(spec.get("max", math.inf))
+        return lambda: min(random.lognormvariate(mu, sigma), cap)
+    if kind == "percentiles":
+        # piecewise-linear inverse CDF through (0, min), (q, value)..., (1, max)
+        points = sorted((float(k[1:]) / 100.0, float(v)) for k, v in spec.items() if _is_percentile(k))
+        qs = [0.0] + [q for q, _ in points]
+        vs = [float(spec.get("min", 0))] + [v for _, v in points]
+        if qs[-1] < 1.0:
+            qs.append(1.0)
+            vs.append(float(spec.get("max", vs[-1])))
+
+        def sample():
+            u = random.random()
+            i = bisect.bisect_right(qs, u)
+            q0, q1 = qs[i - 1], qs[i]
+            return vs[i - 1] + (vs[i] - vs[i - 1]) * (u - q0) / (q1 - q0)
+        return sample
+    raise ValueError(f"Unknown latency distribution {kind!r}")
+
+
+def _is_percentile(key: str) -> bool:
+    return key.startswith("p") and key[1:].replace(".", "", 1).isdigit()
+
+
+async def maybe_delay(latency_ms):
+    """Sleep without blocking the event loop; accepts ms or a compiled sampler."""
+    if callable(latency_ms):
+        latency_ms = latency_ms()
     if latency_ms and latency_ms > 0:
-        time.sleep(latency_ms / 1000.0)
+        await asyncio.sleep(latency_ms / 1000.0)
 
 def maybe_fail(failure_rate: float):
     if failure_rate and random.random() < failure_rate:
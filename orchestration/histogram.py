@@ -0,0 +1,118 @@
+# orchestration/histogram.py
+"""
+Fixed-memory latency histogram in the style of HdrHistogram.
+
+Values (microseconds) below SUB_BUCKETS are stored exactly; above that every
+power-of-two range is split into SUB_BUCKETS / 2 linear sub-buckets, which
+keeps the relative error under ~1.6% while the whole 1us..60s range fits in
+a flat list of ~1.3k counters. Histograms from different workers/processes
+can be merged by adding their counters.
+"""
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_BUCKETS = SUB_BUCKETS // 2
+MAX_VALUE_US = 60_000_000  # anything slower is clamped to 60s
+
+
+def _index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * HALF_BUCKETS + (value >> shift)
+
+
+def _highest_equivalent(index: int) -> int:
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // HALF_BUCKETS - 1
+    mantissa = index - shift * HALF_BUCKETS
+    return (mantissa << shift) + (1 << shift) - 1
+
+
+class LatencyHistogram:
+    def __init__(self, max_value_us: int = MAX_VALUE_US):
+        self.max_value_us = max_value_us
+        self.counts = [0] * (_index(max_value_us) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value_us: int, n: int = 1):
+        value_us = int(value_us)
+        if value_us < 0:
+            value_us = 0
+        elif value_us > self.max_value_us:
+            value_us = self.max_value_us
+        self.counts[_index(value_us)] += n
+        if self.count == 0 or value_us < self.min:
+            self.min = value_us
+        if value_us > self.max:
+            self.max = value_us
+        self.count += n
+        self.total += value_us * n
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.count == 0:
+            return
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+            self.max_value_us = other.max_value_us
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        if self.count == 0 or other.min < self.min:
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def to_dict(self) -> dict:
+        """Sparse JSON-friendly form, for shipping histograms between processes/agents."""
+        return {
+            "max_value_us": self.max_value_us,
+            "counts": {str(i): c for i, c in enumerate(self.counts) if c},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LatencyHistogram":
+        h = cls(d["max_value_us"])
+        for i, c in d["counts"].items():
+            h.counts[int(i)] = c
+        h.count, h.total, h.min, h.max = d["count"], d["total"], d["min"], d["max"]
+        return h
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = self.total = self.min = self.max = 0
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> int:
+        """Value (us) at percentile q (0-100)."""
+        if self.count == 0:
+            return 0
+        if q >= 100:
+            return self.max
+        rank = max(1, int(q / 100.0 * self.count + 0.5))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= rank:
+                    return min(_highest_equivalent(i), self.max)
+        return self.max
+
+    def summary_ms(self, percentiles=(50, 90, 99, 99.9)) -> dict:
+        """Percentiles plus min/mean/max, converted to milliseconds."""
+        out = {f"p{q:g}": round(self.percentile(q) / 1000.0, 3) for q in percentiles}
+        out["min"] = round(self.min / 1000.0, 3)
+        out["mean"] = round(self.mean() / 1000.0, 3)
+        out["max"] = round(self.max / 1000.0, 3)
+        return out
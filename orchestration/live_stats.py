@@ -0,0 +1,148 @@
+# orchestration/live_stats.py
+"""
+Rolling per-second load test stats over a local UDP channel.
+
+While a load test runs, LivePublisher (a sample recorder like
+load_capture.SampleWriter) sends one small JSON datagram per second with
+that second's request count, errors and sparse latency histogram to
+127.0.0.1:LIVE_STATS_PORT. It is fire-and-forget: nothing blocks or fails
+when no dashboard is listening. LiveListener merges the datagrams of every
+process/shard per target and second (histograms are merged, so percentiles
+stay exact) and keeps a fixed number of seconds of history.
+"""
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from orchestration.histogram import LatencyHistogram
+
+LIVE_STATS_PORT = 9310
+HISTORY_S = 60
+# a target counts as active while datagrams keep arriving
+ACTIVE_FOR_S = 5.0
+
+
+class LivePublisher:
+    def __init__(self, target: str, port: int = LIVE_STATS_PORT, host: str = "127.0.0.1"):
+        self.target = target
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.window = LatencyHistogram()
+        self.errors = 0
+        self._task = None
+
+    def record(self, ts: float, latency_us: float, status: int, nbytes: int):
+        self.window.record(latency_us)
+        if status == 0 or status >= 500:
+            self.errors += 1
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        next_at = time.time() // 1 + 1
+        while True:
+            await asyncio.sleep(max(0.0, next_at - time.time()))
+            self.flush(next_at - 1)
+            next_at += 1
+
+    def flush(self, second: float):
+        window, errors = self.window, self.errors
+        self.window, self.errors = LatencyHistogram(), 0
+        msg = {"target": self.target, "pid": os.getpid(), "t": int(second), "errors": errors,
+               "hist": window.to_dict()}
+        try:
+            self.sock.sendto(json.dumps(msg, separators=(",", ":")).encode(), self.address)
+        except OSError:
+            pass  # nobody listening / datagram too large: live stats are best effort
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.flush(time.time())
+        self.sock.close()
+
+
+class Tee:
+    """Fans record() out to several recorders (capture file + live stats)."""
+
+    def __init__(self, *recorders):
+        self.recorders = [r for r in recorders if r is not None]
+
+    def record(self, ts: float, latency_us: float, status: int, nbytes: int):
+        for r in self.recorders:
+            r.record(ts, latency_us, status, nbytes)
+
+
+class LiveListener:
+    """Receives LivePublisher datagrams on a background thread."""
+
+    def __init__(self, port: int = LIVE_STATS_PORT, host: str = "127.0.0.1", history_s: int = HISTORY_S):
+        self.history_s = history_s
+        self.targets = {}  # target -> {second: [LatencyHistogram, errors]}
+        self.last_seen = {}
+        self.lock = threading.Lock()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(1.0)
+        self.on_update = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._receive, daemon=True, name="live-stats")
+        self._thread.start()
+
+    def _receive(self):
+        while not self._stop.is_set():
+            try:
+                data, _ = self.sock.recvfrom(65535)
+                msg = json.loads(data)
+            except (socket.timeout, ValueError):
+                continue
+            except OSError:
+                break
+            with self.lock:
+                seconds = self.targets.setdefault(msg["target"], {})
+                slot = seconds.get(msg["t"])
+                if slot is None:
+                    slot = seconds[msg["t"]] = [LatencyHistogram(), 0]
+                    # bounded history: drop seconds older than the window
+                    for t in [t for t in seconds if t <= msg["t"] - self.history_s]:
+                        del seconds[t]
+                slot[0].merge(LatencyHistogram.from_dict(msg["hist"]))
+                slot[1] += msg["errors"]
+                self.last_seen[msg["target"]] = time.time()
+            if self.on_update is not None:
+                self.on_update()
+
+    def series(self) -> dict:
+        """
+        {target: {"rps": deque, "p50_ms": deque, "p99_ms": deque, "errors": deque}}
+        for targets active in the last ACTIVE_FOR_S seconds, oldest first,
+        one entry per second (gaps filled with zeros).
+        """
+        now = time.time()
+        out = {}
+        with self.lock:
+            for target in [t for t, seen in self.last_seen.items() if now - seen > self.history_s]:
+                del self.targets[target], self.last_seen[target]
+            for target, seconds in self.targets.items():
+                if now - self.last_seen.get(target, 0) > ACTIVE_FOR_S or not seconds:
+                    continue
+                last = max(seconds)
+                cols = {k: deque(maxlen=self.history_s) for k in ("rps", "p50_ms", "p99_ms", "errors")}
+                for t in range(max(min(seconds), last - self.history_s + 1), last + 1):
+                    h, errors = seconds.get(t, (None, 0))
+                    cols["rps"].append(h.count if h else 0)
+                    cols["p50_ms"].append(h.percentile(50) / 1000.0 if h else 0.0)
+                    cols["p99_ms"].append(h.percentile(99) / 1000.0 if h else 0.0)
+                    cols["errors"].append(errors)
+                out[target] = cols
+        return out
+
+    def close(self):
+        self._stop.set()
+        self.sock.close()
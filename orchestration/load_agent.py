@@ -0,0 +1,200 @@
+# orchestration/load_agent.py
+"""
+Distributed load generation: agents and the coordinator that drives them.
+
+An agent is a small TCP server speaking newline-delimited JSON. The
+coordinator connects to every agent, sends each one its share of the target
+rate with a common wall-clock start time, and merges the LoadStats they send
+back into a single report. Agents run as `python -m orchestration.load_agent`
+(the load-agent-N containers emitted by docker_manager.generate_compose) or
+in-process via serve() for local use and testing.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import yaml
+
+from orchestration import load_profiles, load_tester
+from orchestration.load_tester import LoadStats
+
+DEFAULT_AGENT_PORT = 9100
+# time agents get between receiving a job and the common start
+START_GRACE_S = 1.0
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, lock: asyncio.Lock, name: str):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            msg = json.loads(line)
+            cmd = msg.get("cmd")
+            if cmd == "ping":
+                reply = {"ok": True, "agent": name, "busy": lock.locked()}
+            elif cmd == "run":
+                if lock.locked():
+                    reply = {"ok": False, "error": f"agent {name} is already running a job"}
+                else:
+                    async with lock:
+                        reply = await _run_until_hangup(reader, msg["params"], name)
+                    if reply is None:
+                        break
+            else:
+                reply = {"ok": False, "error": f"unknown command {cmd!r}"}
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _run_until_hangup(reader: asyncio.StreamReader, params: dict, name: str):
+    """
+    Run a job, cancelling it if the coordinator goes away first (it sends
+    nothing while waiting for the reply, so a completed read means it hung
+    up, e.g. after its job timeout). Returns None when cancelled.
+    """
+    job = asyncio.create_task(_run_job(params, name))
+    hangup = asyncio.create_task(reader.read(1))
+    await asyncio.wait({job, hangup}, return_when=asyncio.FIRST_COMPLETED)
+    if job.done():
+        hangup.cancel()
+        # the read must be gone before _handle reads the next command
+        await asyncio.gather(hangup, return_exceptions=True)
+        return job.result()
+    job.cancel()
+    await asyncio.gather(job, return_exceptions=True)
+    print(f"[agent {name}] coordinator disconnected, job cancelled")
+    return None
+
+
+async def _run_job(params: dict, name: str) -> dict:
+    params = dict(params)
+    profile = params.pop("profile", None)
+    if profile:
+        params["profile"] = load_profiles.parse_profile(profile, params.get("duration", 10))
+        if "scale" in params:
+            params["profile"] = params["profile"].scaled(params["scale"])
+    params.pop("scale", None)
+    rate = f"profile {profile}" if profile else f"{params.get('rps')} rps"
+    print(f"[agent {name}] running {params.get('method', 'GET')} {params['target_url']} at {rate}")
+    try:
+        stats, sent, elapsed = await load_tester.generate(**params)
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    print(f"[agent {name}] done: {sent} sent in {elapsed:.2f}s")
+    return {"ok": True, "agent": name, "stats": stats.to_dict(), "sent": sent, "elapsed": elapsed}
+
+
+async def serve(host: str = "0.0.0.0", port: int = DEFAULT_AGENT_PORT, name: str = None) -> asyncio.AbstractServer:
+    """Start an agent server on the running loop and return it."""
+    lock = asyncio.Lock()
+    name = name or f"{host}:{port}"
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, lock, name), host, port, limit=MAX_LINE_BYTES)
+    print(f"[agent {name}] listening on {host}:{port}")
+    return server
+
+
+async def _call(address: str, msg: dict, timeout: float) -> dict:
+    host, _, port = address.rpartition(":")
+    reader, writer = await asyncio.open_connection(host, int(port), limit=MAX_LINE_BYTES)
+    try:
+        writer.write(json.dumps(msg).encode() + b"\n")
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+    if not line:
+        raise ConnectionError(f"agent {address} closed the connection")
+    reply = json.loads(line)
+    if not reply.get("ok"):
+        raise RuntimeError(f"agent {address}: {reply.get('error')}")
+    return reply
+
+
+async def _run_on(address: str, params: dict, timeout: float) -> dict:
+    try:
+        return await _call(address, {"cmd": "run", "params": params}, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"agent {address} did not finish within {timeout:.0f}s; "
+                           f"disconnected so the agent cancels its job") from None
+
+
+async def run_distributed(agents: list, target_url: str, method: str = "GET", rps: float = 10, duration: int = 10,
+                          concurrency: int = 10, payload=None, profile: str = None, open_loop: bool = True,
+                          **client_opts) -> dict:
+    """
+    Split the target rate (and concurrency) evenly over `agents`
+    ("host:port" strings), start them on a common wall-clock time and merge
+    their stats into one summary. Each agent generates from one process.
+    """
+    n = len(agents)
+    # a profile sets its own length, which may be far longer than `duration`
+    parsed = load_profiles.parse_profile(profile, duration) if profile else None
+    run_s = parsed.duration if parsed else duration
+    # ping first so a dead agent fails the run before any load is sent
+    await asyncio.gather(*(_call(a, {"cmd": "ping"}, 5.0) for a in agents))
+
+    start_at = time.time() + START_GRACE_S
+    jobs = []
+    for i, address in enumerate(agents):
+        params = dict(target_url=target_url, method=method, rps=rps / n, duration=duration,
+                      concurrency=max(1, concurrency // n), payload=payload, open_loop=open_loop,
+                      start_at=start_at, offset=i / rps, **client_opts)
+        if profile:
+            params.update(profile=profile, scale=1.0 / n, offset=0.0)
+        job_timeout = START_GRACE_S + run_s + client_opts.get("timeout", 10.0) + 30.0
+        jobs.append(asyncio.create_task(_run_on(address, params, job_timeout)))
+    try:
+        replies = await asyncio.gather(*jobs)
+    except BaseException:
+        # closing the other connections makes their agents cancel their jobs
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        raise
+
+    stats = LoadStats()
+    sent, elapsed = 0, 0.0
+    for reply in replies:
+        stats.merge(LoadStats.from_dict(reply["stats"]))
+        sent += reply["sent"]
+        elapsed = max(elapsed, reply["elapsed"])
+    info = dict(target=target_url, method=method, target_rps=rps, duration_s=duration, agents=n)
+    if parsed:
+        info.update(profile=profile, target_rps=parsed.peak(), duration_s=parsed.duration)
+    return stats.summary(sent, elapsed, **info)
+
+
+def agent_addresses(config_file: str = "services.yaml", host: str = "localhost") -> list:
+    """Host-side addresses of the load agents generate_compose emits for config_file."""
+    with open(config_file, "r") as f:
+        cfg = yaml.safe_load(f)
+    agents_cfg = cfg.get("load_agents") or {}
+    base_port = agents_cfg.get("port", DEFAULT_AGENT_PORT)
+    return [f"{host}:{base_port + i}" for i in range(agents_cfg.get("count", 0))]
+
+
+def run_agent(host: str = "0.0.0.0", port: int = DEFAULT_AGENT_PORT, name: str = None):
+    async def _main():
+        server = await serve(host, port, name)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(_main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ServiceStitch load agent")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_AGENT_PORT)
+    parser.add_argument("--name", default=None)
+    args = parser.parse_args()
+    run_agent(args.host, args.port, args.name)
+
+
+if __name__ == "__main__":
+    main()
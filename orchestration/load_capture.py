@@ -0,0 +1,193 @@
+# orchestration/load_capture.py
+"""
+Raw per-request sample capture for the load tester, plus offline reports.
+
+Samples are (wall-clock send time, latency us, status, response bytes);
+status 0 marks a transport error. Files ending in .jsonl are written as JSON
+lines, anything else as fixed 18-byte little-endian records after a short
+magic header. Multi-process runs write one file per shard (PATH.p0,
+PATH.p1, ...) and the readers pick them all up.
+"""
+import glob
+import json
+import os
+import queue
+import struct
+import threading
+from collections import Counter
+
+from orchestration.histogram import LatencyHistogram
+
+MAGIC = b"SSLOAD1\n"
+RECORD = struct.Struct("<dIHI")
+# hand a buffer to the writer thread once it reaches this many bytes / lines
+FLUSH_BYTES = 64 * 1024
+FLUSH_LINES = 1024
+
+
+class SampleWriter:
+    """
+    Buffers samples in memory on the event loop and hands full buffers to a
+    background thread for the actual file I/O, so record() never blocks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl")
+        self._buf = [] if self.jsonl else bytearray()
+        self._pending = 0
+        self._q = queue.SimpleQueue()
+        self._f = open(path, "w" if self.jsonl else "wb")
+        if not self.jsonl:
+            self._f.write(MAGIC)
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def record(self, ts: float, latency_us: float, status: int, nbytes: int):
+        if self.jsonl:
+            self._buf.append(f'{{"ts":{ts:.6f},"latency_us":{int(latency_us)},"status":{status},"bytes":{nbytes}}}\n')
+            self._pending += 1
+            if self._pending >= FLUSH_LINES:
+                self._handoff()
+        else:
+            self._buf += RECORD.pack(ts, min(int(latency_us), 0xFFFFFFFF), status, min(nbytes, 0xFFFFFFFF))
+            if len(self._buf) >= FLUSH_BYTES:
+                self._handoff()
+
+    def _handoff(self):
+        self._q.put("".join(self._buf) if self.jsonl else bytes(self._buf))
+        self._buf = [] if self.jsonl else bytearray()
+        self._pending = 0
+
+    def _drain(self):
+        while True:
+            chunk = self._q.get()
+            if chunk is None:
+                break
+            self._f.write(chunk)
+
+    def close(self):
+        if self._buf:
+            self._handoff()
+        self._q.put(None)
+        self._thread.join()
+        self._f.close()
+
+
+def shard_path(path: str, index: int) -> str:
+    return f"{path}.p{index}"
+
+
+def expand_paths(path: str) -> list:
+    if os.path.exists(path):
+        return [path]
+    shards = sorted(glob.glob(glob.escape(path) + ".p*"))
+    if not shards:
+        raise FileNotFoundError(f"No capture file {path} (or {path}.p*)")
+    return shards
+
+
+def read_samples(path: str):
+    """Yield (ts, latency_us, status, nbytes) from a capture (or its shards)."""
+    for p in expand_paths(path):
+        with open(p, "rb") as f:
+            head = f.read(len(MAGIC))
+            if head == MAGIC:
+                size = RECORD.size
+                while True:
+                    chunk = f.read(size * 4096)
+                    if not chunk:
+                        break
+                    yield from RECORD.iter_unpack(chunk[: len(chunk) - len(chunk) % size])
+            else:
+                f.seek(0)
+                for line in f:
+                    if line.strip():
+                        s = json.loads(line)
+                        yield s["ts"], s["latency_us"], s["status"], s["bytes"]
+
+
+def build_report(path: str) -> dict:
+    """Rebuild the run summary and a per-second time series from raw samples."""
+    # imported here to avoid a cycle: load_tester imports this module
+    from orchestration.load_tester import LoadStats
+
+    stats = LoadStats()
+    seconds = {}
+    first = end = None
+    total_bytes = 0
+    for ts, latency_us, status, nbytes in read_samples(path):
+        stats.latency.record(latency_us)
+        if status:
+            stats.status_codes[status] += 1
+        else:
+            stats.errors["TransportError"] += 1
+        total_bytes += nbytes
+        first = ts if first is None or ts < first else first
+        # like the live summary, the run ends when the last response completes
+        done = ts + latency_us / 1e6
+        end = done if end is None or done > end else end
+
+        sec = int(ts)
+        bucket = seconds.get(sec)
+        if bucket is None:
+            bucket = seconds[sec] = [LatencyHistogram(), Counter()]
+        bucket[0].record(latency_us)
+        bucket[1]["errors" if (status == 0 or status >= 500) else "ok"] += 1
+
+    elapsed = max(end - first, 1e-3) if first is not None else 0.0
+    summary = stats.summary(stats.latency.count, elapsed, target=path, method="CAPTURE", target_rps=None, duration_s=round(elapsed, 3))
+    summary["bytes"] = total_bytes
+    start = min(seconds) if seconds else 0
+    summary["timeseries"] = [
+        {
+            "t": sec - start,
+            "requests": hist.count,
+            "errors": counts["errors"],
+            "p50_ms": round(hist.percentile(50) / 1000.0, 3),
+            "p99_ms": round(hist.percentile(99) / 1000.0, 3),
+            "max_ms": round(hist.max / 1000.0, 3),
+        }
+        for sec, (hist, counts) in sorted(seconds.items())
+    ]
+    return summary
+
+
+def load_summary(path: str) -> dict:
+    """A --json-out summary or a raw capture, whichever `path` is; ValueError for anything else."""
+    if not path.endswith(".json"):
+        return build_report(path)
+    with open(path) as f:
+        summary = json.load(f)
+    if "knee_rps" in summary:
+        raise ValueError(f"{path} is a --find-max result, not a run summary; compare single runs or captures")
+    missing = [key for key in ("latency_ms", "throughput_rps", "error_rate") if key not in summary]
+    if missing:
+        raise ValueError(f"{path} is not a load summary (no {', '.join(missing)})")
+    return summary
+
+
+def compare(baseline: dict, candidate: dict, latency_tolerance: float = 0.10, throughput_tolerance: float = 0.05,
+            error_tolerance: float = 0.005, min_latency_delta_ms: float = 1.0, percentiles=("p50", "p90", "p99")) -> dict:
+    """
+    Diff two run summaries. A percentile regresses when it grew by more than
+    latency_tolerance (relative) and min_latency_delta_ms (absolute);
+    throughput regresses when it fell by more than throughput_tolerance.
+    """
+    rows, regressions = [], []
+    for p in percentiles:
+        base, cand = baseline["latency_ms"][p], candidate["latency_ms"][p]
+        bad = cand > base * (1 + latency_tolerance) and cand - base >= min_latency_delta_ms
+        rows.append({"metric": f"latency {p} ms", "baseline": base, "candidate": cand, "regressed": bad})
+    base, cand = baseline["throughput_rps"], candidate["throughput_rps"]
+    rows.append({"metric": "throughput rps", "baseline": base, "candidate": cand,
+                 "regressed": cand < base * (1 - throughput_tolerance)})
+    base, cand = baseline["error_rate"], candidate["error_rate"]
+    rows.append({"metric": "error rate", "baseline": base, "candidate": cand,
+                 "regressed": cand > base + error_tolerance})
+    for row in rows:
+        base = row["baseline"]
+        row["change"] = round((row["candidate"] - base) / base, 4) if base else None
+        if row["regressed"]:
+            regressions.append(row["metric"])
+    return {"rows": rows, "regressions": regressions}
@@ -0,0 +1,182 @@
+# orchestration/load_profiles.py
+"""
+Time-varying arrival rates for the open-loop load generator.
+
+A profile maps seconds-since-start to a target rate. Specs accepted on the
+command line (DURATION comes from --duration unless the spec fixes it):
+
+    constant:RPS
+    ramp:FROM:TO                 linear ramp over the run
+    steps:RPSxSECS,RPSxSECS,...  stepped stages, total length = sum of SECS
+    spike:BASE:PEAK:AT:LENGTH    BASE rps with a PEAK burst at second AT
+    soak:RPS                     constant rate, meant for long runs
+
+The generator sends request n at time_of(n + 0.5) (see arrival_times): the
+point where the integrated rate reaches that many arrivals, so low or
+changing rates keep their shape instead of being sampled once per gap.
+"""
+import math
+
+
+class Profile:
+    duration = 0.0
+
+    def rate_at(self, t: float) -> float:
+        raise NotImplementedError
+
+    def peak(self) -> float:
+        raise NotImplementedError
+
+    def time_of(self, arrivals: float) -> float:
+        """Seconds until the integrated rate reaches `arrivals` (math.inf if it never does)."""
+        raise NotImplementedError
+
+    def scaled(self, factor: float) -> "Profile":
+        """Same shape at factor x the rate (used to shard across processes)."""
+        raise NotImplementedError
+
+
+class ConstantProfile(Profile):
+    def __init__(self, rps: float, duration: float):
+        self.rps = rps
+        self.duration = duration
+
+    def rate_at(self, t):
+        return self.rps
+
+    def peak(self):
+        return self.rps
+
+    def time_of(self, arrivals):
+        return _piecewise_time_of([(self.rps, math.inf)], arrivals)
+
+    def scaled(self, factor):
+        return ConstantProfile(self.rps * factor, self.duration)
+
+
+class RampProfile(Profile):
+    def __init__(self, start_rps: float, end_rps: float, duration: float):
+        self.start_rps = start_rps
+        self.end_rps = end_rps
+        self.duration = duration
+
+    def rate_at(self, t):
+        return self.start_rps + (self.end_rps - self.start_rps) * min(t / self.duration, 1.0)
+
+    def peak(self):
+        return max(self.start_rps, self.end_rps)
+
+    def time_of(self, arrivals):
+        a = self.start_rps
+        slope = (self.end_rps - a) / self.duration
+        # the ramp's area is a t + slope t^2 / 2; past its end the rate stays at end_rps
+        in_ramp = (a + self.end_rps) / 2 * self.duration
+        if arrivals > in_ramp:
+            return self.duration + _piecewise_time_of([(self.end_rps, math.inf)], arrivals - in_ramp)
+        if arrivals <= 0:
+            return 0.0
+        if slope == 0:
+            return arrivals / a
+        # root of slope/2 t^2 + a t - arrivals, in a form that is stable for slope -> 0
+        return 2 * arrivals / (a + math.sqrt(max(0.0, a * a + 2 * slope * arrivals)))
+
+    def scaled(self, factor):
+        return RampProfile(self.start_rps * factor, self.end_rps * factor, self.duration)
+
+
+class StepProfile(Profile):
+    def __init__(self, stages: list):
+        """stages: list of (rps, seconds)."""
+        self.stages = stages
+        self.duration = sum(secs for _, secs in stages)
+
+    def rate_at(self, t):
+        for rps, secs in self.stages:
+            if t < secs:
+                return rps
+            t -= secs
+        return self.stages[-1][0]
+
+    def peak(self):
+        return max(rps for rps, _ in self.stages)
+
+    def time_of(self, arrivals):
+        stages = self.stages[:-1] + [(self.stages[-1][0], math.inf)]
+        return _piecewise_time_of(stages, arrivals)
+
+    def scaled(self, factor):
+        return StepProfile([(rps * factor, secs) for rps, secs in self.stages])
+
+
+class SpikeProfile(Profile):
+    def __init__(self, base_rps: float, peak_rps: float, duration: float, spike_at: float, spike_length: float):
+        self.base_rps = base_rps
+        self.peak_rps = peak_rps
+        self.duration = duration
+        self.spike_at = spike_at
+        self.spike_length = spike_length
+
+    def rate_at(self, t):
+        if self.spike_at <= t < self.spike_at + self.spike_length:
+            return self.peak_rps
+        return self.base_rps
+
+    def peak(self):
+        return max(self.base_rps, self.peak_rps)
+
+    def time_of(self, arrivals):
+        return _piecewise_time_of([(self.base_rps, self.spike_at), (self.peak_rps, self.spike_length),
+                                   (self.base_rps, math.inf)], arrivals)
+
+    def scaled(self, factor):
+        return SpikeProfile(self.base_rps * factor, self.peak_rps * factor, self.duration, self.spike_at, self.spike_length)
+
+
+def arrival_times(profile: Profile):
+    """Send offsets (seconds from the start) of every request in the run."""
+    n = 0
+    t = profile.time_of(0.5)
+    while t < profile.duration:
+        yield t
+        n += 1
+        t = profile.time_of(n + 0.5)
+
+
+def _piecewise_time_of(stages: list, arrivals: float) -> float:
+    """time_of for consecutive (rps, seconds) stages of constant rate."""
+    t = 0.0
+    for rps, secs in stages:
+        if rps > 0:
+            if arrivals <= rps * secs:
+                return t + arrivals / rps
+            arrivals -= rps * secs
+        t += secs
+    return math.inf
+
+
+PROFILE_KINDS = ("constant", "ramp", "steps", "spike", "soak")
+
+
+def parse_profile(spec: str, duration: float) -> Profile:
+    kind, _, args = spec.partition(":")
+    if kind not in PROFILE_KINDS:
+        raise ValueError(f"Unknown load profile '{kind}' ({', '.join(PROFILE_KINDS)})")
+    parts = args.split(":") if args else []
+    try:
+        if kind in ("constant", "soak"):
+            profile = ConstantProfile(float(parts[0]), duration)
+        elif kind == "ramp":
+            profile = RampProfile(float(parts[0]), float(parts[1]), duration)
+        elif kind == "steps":
+            stages = []
+            for stage in args.split(","):
+                rps, secs = stage.split("x")
+                stages.append((float(rps), float(secs)))
+            profile = StepProfile(stages)
+        else:
+            base, peak, at, length = (float(p) for p in parts[:4])
+            profile = SpikeProfile(base, peak, duration, at, length)
+    except (IndexError, ValueError):
+        raise ValueError(f"Malformed load profile '{spec}'")
+    profile.spec = spec
+    return profile
@@ -1,54 +1,494 @@
 # orchestration/load_tester.py
 import asyncio
+import json
+import multiprocessing
 import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import httpx
 
-async def worker(target: str, q: asyncio.Queue):
-    async with httpx.AsyncClient() as client:
-        while True:
-            item = await q.get()
-            if item is None:
-                break
-            method, url, data = item
-            try:
-                if method == "GET":
-                    r = await client.get(url, timeout=10)
-                else:
-                    r = await client.request(method, url, json=data, timeout=10)
-                print(f"[load] {method} {url} -> {r.status_code}")
-            except Exception as e:
-                print(f"[load] error {method} {url} -> {e}")
-            finally:
-                q.task_done()
-
-async def run_load(target_url: str, method: str = "GET", rps: int = 10, duration: int = 10, concurrency: int = 10, payload=None):
+from orchestration import live_stats, load_capture, load_profiles, scenarios
+from orchestration.histogram import LatencyHistogram
+from orchestration.load_profiles import Profile
+from orchestration.scenarios import Scenario
+
+# above this the generator itself is the bottleneck
+GENERATOR_CPU_LIMIT = 90.0
+# schedule lag worth pointing out (without high CPU it is host noise, not saturation)
+GENERATOR_LAG_LIMIT_MS = 10.0
+# above this requests sat waiting for a free worker: --concurrency is the limit
+QUEUE_WAIT_LIMIT_MS = 10.0
+POOL_SHARD_SIZE = 8
+# a search stage fails if less than this share of the offered rate completes
+SATURATION_THROUGHPUT_RATIO = 0.9
+
+# queue sentinel telling a worker to exit (None means "send now", closed-loop)
+_STOP = object()
+
+
+class LoadStats:
+    """Per-worker counters; merged into one report at the end of a run."""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        # scheduled -> enqueued (the generator's own lateness) and
+        # enqueued -> picked up by a worker (waiting for a free worker)
+        self.lag = LatencyHistogram()
+        self.queue_wait = LatencyHistogram()
+        self.status_codes = Counter()
+        self.errors = Counter()
+        # CPU seconds burnt by the generator processes themselves
+        self.cpu_s = 0.0
+        self.generators = 0
+        # scenario mode: per-step stats, flows aborted by a failing step
+        self.steps = {}
+        self.aborted = 0
+
+    def step(self, name: str) -> "LoadStats":
+        s = self.steps.get(name)
+        if s is None:
+            s = self.steps[name] = LoadStats()
+        return s
+
+    def merge(self, other: "LoadStats"):
+        self.latency.merge(other.latency)
+        self.lag.merge(other.lag)
+        self.queue_wait.merge(other.queue_wait)
+        self.status_codes.update(other.status_codes)
+        self.errors.update(other.errors)
+        self.cpu_s += other.cpu_s
+        self.generators += other.generators
+        self.aborted += other.aborted
+        for name, s in other.steps.items():
+            self.step(name).merge(s)
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": self.latency.to_dict(),
+            "lag": self.lag.to_dict(),
+            "queue_wait": self.queue_wait.to_dict(),
+            "status_codes": {str(s): c for s, c in self.status_codes.items()},
+            "errors": dict(self.errors),
+            "cpu_s": self.cpu_s,
+            "generators": self.generators,
+            "aborted": self.aborted,
+            "steps": {name: s.to_dict() for name, s in self.steps.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LoadStats":
+        stats = cls()
+        stats.latency = LatencyHistogram.from_dict(d["latency"])
+        stats.lag = LatencyHistogram.from_dict(d["lag"])
+        if "queue_wait" in d:
+            stats.queue_wait = LatencyHistogram.from_dict(d["queue_wait"])
+        stats.status_codes = Counter({int(s): c for s, c in d["status_codes"].items()})
+        stats.errors = Counter(d["errors"])
+        stats.cpu_s = d["cpu_s"]
+        stats.generators = d["generators"]
+        stats.aborted = d["aborted"]
+        stats.steps = {name: cls.from_dict(s) for name, s in d["steps"].items()}
+        return stats
+
+    def summary(self, sent: int, elapsed: float, **info) -> dict:
+        completed = self.latency.count
+        if self.steps:
+            failed = self.aborted
+        else:
+            failed = sum(self.errors.values()) + sum(c for s, c in self.status_codes.items() if s >= 500)
+        out = dict(info)
+        out.update({
+            "sent": sent,
+            "completed": completed,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(failed / completed, 4) if completed else 0.0,
+            "latency_ms": self.latency.summary_ms(),
+            "status_codes": {str(s): c for s, c in sorted(self.status_codes.items())},
+            "errors": dict(self.errors),
+        })
+        if self.lag.count:
+            out["schedule_lag_ms"] = self.lag.summary_ms()
+        if self.queue_wait.count:
+            out["queue_wait_ms"] = self.queue_wait.summary_ms()
+        if self.steps:
+            out["steps"] = {
+                name: {
+                    "requests": s.latency.count,
+                    "latency_ms": s.latency.summary_ms(),
+                    "status_codes": {str(c): n for c, n in sorted(s.status_codes.items())},
+                    "errors": dict(s.errors),
+                }
+                for name, s in self.steps.items()
+            }
+        if self.generators and elapsed:
+            out["generator"] = {
+                "cpu_s": round(self.cpu_s, 3),
+                "cpu_percent": round(self.cpu_s / (elapsed * self.generators) * 100.0, 1),
+                "us_per_request": round(self.cpu_s / sent * 1e6, 1) if sent else 0.0,
+            }
+        return out
+
+
+def make_clients(concurrency: int, http2: bool = False, max_connections: int = None, max_keepalive: int = None, timeout: float = 10.0) -> list:
     """
-    target_url: full URL (http://localhost:8001/projects)
-    rps: requests per second
-    duration: seconds
-    concurrency: number of worker tasks
+    The per-process connection pool shared by all worker tasks.
+
+    httpcore re-scans every pooled connection for every queued request, so
+    one big pool gets quadratically slower as it grows; the connection budget
+    is therefore split over a few clients of at most POOL_SHARD_SIZE
+    connections each (a single client for HTTP/2, which multiplexes anyway).
     """
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            raise RuntimeError("HTTP/2 needs the h2 package: pip install 'httpx[http2]'")
+    max_connections = max_connections or concurrency
+    max_keepalive = max_keepalive if max_keepalive is not None else max_connections
+    shards = 1 if http2 else -(-max_connections // POOL_SHARD_SIZE)
+    clients = []
+    for i in range(shards):
+        limits = httpx.Limits(
+            max_connections=max_connections // shards + (i < max_connections % shards),
+            max_keepalive_connections=max_keepalive // shards + (i < max_keepalive % shards),
+        )
+        clients.append(httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2))
+    return clients
+
+
+async def worker(client: httpx.AsyncClient, q: asyncio.Queue, stats: LoadStats, method: str, url: str, data=None, recorder=None, wall_offset: float = 0.0):
+    loop = asyncio.get_running_loop()
+    request = client.request
+    record_lag = stats.lag.record
+    record_wait = stats.queue_wait.record
+    record_latency = stats.latency.record
+    status_codes = stats.status_codes
+    while True:
+        item = await q.get()
+        if item is _STOP:
+            q.task_done()
+            break
+        intended = None
+        if item is not None:
+            intended, enqueued = item
+            # how late the scheduler was, and how long the request then waited for this worker
+            record_lag((enqueued - intended) * 1e6)
+            record_wait((loop.time() - enqueued) * 1e6)
+        # open-loop: latency counts from the intended send time so a
+        # slow response can't hide the requests queued up behind it
+        start = intended if intended is not None else loop.time()
+        status, nbytes = 0, 0
+        try:
+            r = await request(method, url, json=data)
+            status, nbytes = r.status_code, len(r.content)
+            status_codes[status] += 1
+        except Exception as e:
+            stats.errors[type(e).__name__] += 1
+        finally:
+            latency_us = (loop.time() - start) * 1e6
+            record_latency(latency_us)
+            if recorder is not None:
+                recorder.record(start + wall_offset, latency_us, status, nbytes)
+            q.task_done()
+
+async def scenario_worker(client: httpx.AsyncClient, q: asyncio.Queue, stats: LoadStats, scenario: Scenario, recorder=None, wall_offset: float = 0.0):
+    """Like worker, but every scheduled arrival runs a whole weighted flow."""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await q.get()
+        if item is _STOP:
+            q.task_done()
+            break
+        intended = None
+        if item is not None:
+            intended, enqueued = item
+            stats.lag.record((enqueued - intended) * 1e6)
+            stats.queue_wait.record((loop.time() - enqueued) * 1e6)
+        start = intended if intended is not None else loop.time()
+        try:
+            if not await scenarios.run_flow(client, scenario, stats, loop, recorder, wall_offset):
+                stats.aborted += 1
+        finally:
+            stats.latency.record((loop.time() - start) * 1e6)
+            q.task_done()
+
+async def generate(target_url: str, method: str = "GET", rps: float = 10, duration: int = 10, concurrency: int = 10, payload=None, open_loop: bool = True, start_at: float = None, offset: float = 0.0, scenario: Scenario = None, profile: Profile = None, record: str = None, live: int = None, **client_opts):
+    """
+    Drive the load and return the raw (LoadStats, sent, elapsed) triple so
+    callers can merge several generators before summarising.
+
+    start_at: wall-clock time (time.time()) to begin at, used to line up
+        several processes/agents
+    offset: shift this generator's schedule by a fraction of a second so
+        shards sharing one target rate interleave instead of bursting
+    scenario: run weighted multi-step flows instead of hitting target_url;
+        rps is then flows per second and latency is whole-flow latency
+    profile: time-varying rate (see load_profiles) instead of a constant
+        rps; the run lasts profile.duration
+    record: stream every sample to this file (see load_capture)
+    live: publish per-second stats to the dashboard on this local UDP port
+        (see live_stats)
+    client_opts: http2 / max_connections / max_keepalive / timeout, see make_clients
+    """
+    loop = asyncio.get_running_loop()
+    clients = make_clients(concurrency, **client_opts)
+    capture = load_capture.SampleWriter(record) if record else None
+    publisher = None
+    if live:
+        publisher = live_stats.LivePublisher(scenario.name if scenario is not None else f"{method} {target_url}", live)
+        publisher.start()
+    recorder = live_stats.Tee(capture, publisher) if capture and publisher else (capture or publisher)
+    wall_offset = time.time() - loop.time()
     q = asyncio.Queue()
-    workers = [asyncio.create_task(worker(target_url, q)) for _ in range(concurrency)]
+    per_worker = [LoadStats() for _ in range(concurrency)]
+    if scenario is not None:
+        workers = [asyncio.create_task(scenario_worker(clients[i % len(clients)], q, s, scenario, recorder, wall_offset))
+                   for i, s in enumerate(per_worker)]
+    else:
+        workers = [asyncio.create_task(worker(clients[i % len(clients)], q, s, method, target_url, payload, recorder, wall_offset))
+                   for i, s in enumerate(per_worker)]
+
+    if start_at is not None:
+        wait = start_at - time.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
 
-    start = time.time()
+    cpu_start = time.process_time()
+    start = loop.time() + offset
     interval = 1.0 / rps
     sent = 0
     try:
-        while time.time() - start < duration:
-            # enqueue one request
-            await q.put((method, target_url, payload))
-            sent += 1
-            await asyncio.sleep(interval)
+        if profile is not None:
+            if not open_loop:
+                raise ValueError("load profiles need open-loop scheduling")
+            for t in load_profiles.arrival_times(profile):
+                intended = start + t
+                delay = intended - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await q.put((intended, loop.time()))
+                sent += 1
+        elif open_loop:
+            total = int(rps * duration)
+            while sent < total:
+                intended = start + sent * interval
+                delay = intended - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # behind schedule: enqueue immediately and keep the original
+                # timestamp so the wait shows up in the latency
+                await q.put((intended, loop.time()))
+                sent += 1
+        else:
+            while loop.time() - start < duration:
+                # enqueue one request
+                await q.put(None)
+                sent += 1
+                await asyncio.sleep(interval)
     finally:
         # stop workers
         for _ in workers:
-            await q.put(None)
+            await q.put(_STOP)
         await q.join()
         for w in workers:
             w.cancel()
-    print(f"[load] finished sending {sent} requests")
+        for client in clients:
+            await client.aclose()
+        if capture is not None:
+            capture.close()
+        if publisher is not None:
+            publisher.close()
+    elapsed = loop.time() - start
+
+    stats = LoadStats()
+    for s in per_worker:
+        stats.merge(s)
+    stats.cpu_s = time.process_time() - cpu_start
+    stats.generators = 1
+    return stats, sent, elapsed
+
+async def run_load(target_url: str, method: str = "GET", rps: int = 10, duration: int = 10, concurrency: int = 10, payload=None, open_loop: bool = True, **opts):
+    """
+    target_url: full URL (http://localhost:8001/projects)
+    rps: requests per second
+    duration: seconds
+    concurrency: number of worker tasks
+    open_loop: schedule every request at an absolute time (start + i / rps)
+        instead of sleeping after each enqueue, so slow responses never
+        throttle the send rate (no coordinated omission)
+    opts: further generate() options (scenario, http2, max_connections, ...)
+
+    Returns a summary dict (see LoadStats.summary).
+    """
+    stats, sent, elapsed = await generate(target_url, method, rps, duration, concurrency, payload, open_loop, **opts)
+    return stats.summary(sent, elapsed, **_describe(target_url, method, rps, duration, opts))
+
+def _describe(target_url, method, rps, duration, opts) -> dict:
+    scenario = opts.get("scenario")
+    if scenario is not None:
+        out = dict(target=scenario.name, method="SCENARIO", target_rps=rps, duration_s=duration)
+    else:
+        out = dict(target=target_url, method=method, target_rps=rps, duration_s=duration)
+    profile = opts.get("profile")
+    if profile is not None:
+        out.update(profile=getattr(profile, "spec", type(profile).__name__), target_rps=profile.peak(), duration_s=profile.duration)
+    return out
+
+def _run_shard(kwargs: dict):
+    # entry point of a child process: own event loop, own connection pool
+    return asyncio.run(generate(**kwargs))
+
+def run_multiprocess(target_url: str, method: str = "GET", rps: int = 10, duration: int = 10, concurrency: int = 10, payload=None, open_loop: bool = True, processes: int = 2, **opts):
+    """
+    Shard the target rate across `processes` worker processes and merge
+    their histograms and counters into one summary.
+    """
+    shard_rps = rps / processes
+    shard_concurrency = max(1, concurrency // processes)
+    # give every child time to spawn and import before the common start
+    start_at = time.time() + 1.0 + 0.1 * processes
+    shards = [
+        dict(target_url=target_url, method=method, rps=shard_rps, duration=duration,
+             concurrency=shard_concurrency, payload=payload, open_loop=open_loop,
+             start_at=start_at, offset=i / rps, **opts)
+        for i in range(processes)
+    ]
+    if opts.get("record"):
+        for i, shard in enumerate(shards):
+            shard["record"] = load_capture.shard_path(opts["record"], i)
+    if opts.get("scenario") is not None:
+        # each process gets its own slice of {{iteration}} values
+        for i, shard in enumerate(shards):
+            shard["scenario"] = opts["scenario"].sharded(i, processes)
+    if opts.get("profile") is not None:
+        for shard in shards:
+            shard["profile"] = opts["profile"].scaled(1.0 / processes)
+            shard["offset"] = 0.0
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+        results = list(pool.map(_run_shard, shards))
+
+    stats = LoadStats()
+    sent = 0
+    elapsed = 0.0
+    for shard_stats, shard_sent, shard_elapsed in results:
+        stats.merge(shard_stats)
+        sent += shard_sent
+        elapsed = max(elapsed, shard_elapsed)
+    return stats.summary(sent, elapsed, processes=processes, **_describe(target_url, method, rps, duration, opts))
+
+def start_sync(target_url: str, method: str = "GET", rps: int = 10, duration: int = 10, concurrency: int = 10, payload=None, open_loop: bool = True, processes: int = 1, **opts):
+    if processes > 1:
+        return run_multiprocess(target_url, method, rps, duration, concurrency, payload, open_loop, processes, **opts)
+    return asyncio.run(run_load(target_url, method, rps, duration, concurrency, payload, open_loop, **opts))
+
+def find_max_throughput(target_url: str, method: str = "GET", start_rps: float = 10, max_rps: float = 100000, step_factor: float = 1.5,
+                        stage_duration: int = 10, slo_p99_ms: float = 100.0, slo_error_rate: float = 0.01, refine: int = 3,
+                        concurrency: int = 10, payload=None, processes: int = 1, on_stage=None, **opts) -> dict:
+    """
+    Raise the offered rate by step_factor per stage until the p99 or the
+    error-rate SLO breaks (or the target stops keeping up with the offered
+    rate), then bisect `refine` times between the last passing and the first
+    failing rate. Returns the knee (highest passing rate) and every stage.
+    """
+    stages = []
+
+    def run_stage(rps):
+        summary = start_sync(target_url, method, rps, stage_duration, concurrency, payload,
+                             processes=processes, **opts)
+        reason = _slo_breach(summary, rps, slo_p99_ms, slo_error_rate)
+        stages.append({"rps": rps, "passed": reason is None, "reason": reason,
+                       "throughput_rps": summary["throughput_rps"], "error_rate": summary["error_rate"],
+                       "latency_ms": summary["latency_ms"]})
+        if on_stage:
+            on_stage(stages[-1])
+        return reason
+
+    knee, failed_at, reason = None, None, None
+    rps = start_rps
+    while rps <= max_rps:
+        reason = run_stage(rps)
+        if reason:
+            failed_at = rps
+            break
+        knee = rps
+        rps = round(rps * step_factor, 1)
+
+    if knee is not None and failed_at is not None:
+        low, high = knee, failed_at
+        for _ in range(refine):
+            mid = round((low + high) / 2.0, 1)
+            if mid in (low, high):
+                break
+            if run_stage(mid):
+                high = mid
+            else:
+                low = mid
+        knee = low
+
+    return {
+        "target": target_url,
+        "knee_rps": knee,
+        "first_failing_rps": failed_at,
+        "reason": reason,
+        "slo": {"p99_ms": slo_p99_ms, "error_rate": slo_error_rate},
+        "stages": stages,
+    }
+
+def _slo_breach(summary: dict, rps: float, slo_p99_ms: float, slo_error_rate: float):
+    if summary["latency_ms"]["p99"] > slo_p99_ms:
+        return f"p99 {summary['latency_ms']['p99']} ms > {slo_p99_ms} ms"
+    if summary["error_rate"] > slo_error_rate:
+        return f"error rate {summary['error_rate']:.2%} > {slo_error_rate:.2%}"
+    if summary["throughput_rps"] < rps * SATURATION_THROUGHPUT_RATIO:
+        return f"throughput {summary['throughput_rps']} rps < {SATURATION_THROUGHPUT_RATIO:.0%} of offered"
+    return None
+
+def format_summary(summary: dict) -> str:
+    lat = summary["latency_ms"]
+    lines = [
+        f"[load] {summary['method']} {summary['target']}"
+        + (f" ({summary['processes']} processes)" if summary.get("processes") else "")
+        + (f" ({summary['agents']} agents)" if summary.get("agents") else "")
+        + (f" profile {summary['profile']}" if summary.get("profile") else ""),
+        f"[load] sent {summary['sent']}, completed {summary['completed']} in {summary['elapsed_s']:.2f}s"
+        f" -> {summary['throughput_rps']:.1f} rps"
+        + (f" (target {summary['target_rps']})" if summary.get("target_rps") is not None else ""),
+        f"[load] latency ms: p50 {lat['p50']}  p90 {lat['p90']}  p99 {lat['p99']}  p99.9 {lat['p99.9']}  max {lat['max']}",
+        "[load] status codes: " + (", ".join(f"{s}={c}" for s, c in summary["status_codes"].items()) or "none"),
+        f"[load] error rate: {summary['error_rate'] * 100:.2f}%",
+    ]
+    if summary["errors"]:
+        lines.append("[load] errors: " + ", ".join(f"{e}={c}" for e, c in summary["errors"].items()))
+    for name, step in summary.get("steps", {}).items():
+        sl = step["latency_ms"]
+        codes = ", ".join(f"{s}={c}" for s, c in step["status_codes"].items()) or "none"
+        lines.append(f"[load]   step {name}: {step['requests']} req, p50 {sl['p50']}  p99 {sl['p99']}  max {sl['max']} ms [{codes}]")
+    if "schedule_lag_ms" in summary:
+        lag = summary["schedule_lag_ms"]
+        lines.append(f"[load] generator lag ms: mean {lag['mean']}  p99 {lag['p99']}  max {lag['max']}")
+    if "queue_wait_ms" in summary:
+        wait = summary["queue_wait_ms"]
+        lines.append(f"[load] worker wait ms: mean {wait['mean']}  p99 {wait['p99']}  max {wait['max']}")
+    if "generator" in summary:
+        gen = summary["generator"]
+        lines.append(f"[load] generator cpu: {gen['cpu_percent']}% ({gen['us_per_request']} us/request)")
+        lag_p99 = summary.get("schedule_lag_ms", {}).get("p99", 0)
+        if gen["cpu_percent"] >= GENERATOR_CPU_LIMIT:
+            lines.append(f"[load] WARNING: the load generator is saturated (cpu {gen['cpu_percent']}%, "
+                         f"schedule lag p99 {lag_p99} ms), results reflect the generator rather than "
+                         f"the target (try --processes)")
+        elif lag_p99 >= GENERATOR_LAG_LIMIT_MS:
+            lines.append(f"[load] note: the scheduler ran late (p99 {lag_p99} ms) while the generator was "
+                         f"mostly idle; something else on this host is competing for CPU")
+    wait_p99 = summary.get("queue_wait_ms", {}).get("p99", 0)
+    if wait_p99 >= QUEUE_WAIT_LIMIT_MS:
+        lines.append(f"[load] WARNING: requests waited for a free worker (p99 {wait_p99} ms): "
+                     f"--concurrency is limiting the offered rate, not the generator's CPU "
+                     f"(raise --concurrency)")
+    return "\n".join(lines)
 
-def start_sync(target_url: str, method: str = "GET", rps: int = 10, duration: int = 10, concurrency: int = 10, payload=None):
-    asyncio.run(run_load(target_url, method, rps, duration, concurrency, payload))
-    
\ No newline at end of file
+def write_summary(summary: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
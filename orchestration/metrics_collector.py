@@ -0,0 +1,353 @@
+# orchestration/metrics_collector.py
+"""
+Central metrics collector for a stitched environment.
+
+Scrapes every mock's Prometheus endpoint (see mock_metrics.py) at a fixed
+interval and keeps, per service, a bounded ring buffer of compact samples:
+request/error counters, the latency histogram summed over routes, in-flight
+requests and NATS counters. Queries are answered from the delta between
+two samples, so "rps and p99 over the last 30s" never re-reads raw data.
+
+A mock with several uvicorn workers has one set of counters per worker and
+each scrape reaches whichever worker accepts it. Samples carry a `pid`
+label, the collector keeps the latest counters of every pid and stores
+their sum, so the per-service counters only grow however scrapes land.
+Workers not seen for PROCESS_EXPIRY_S are folded into a fixed offset.
+
+HTTP API (JSON):
+
+    GET /services                   targets, last scrape and whether it was up
+    GET /query?window=60            per-service + total rps, error rate, p50/p90/p99
+    GET /series?service=x&window=60 per-interval rps / error rate / p99 rows
+
+Runs as `python -m orchestration.metrics_collector` in the metrics-collector
+container docker_manager.generate_compose emits when services.yaml has a
+`metrics_collector:` block; the CLI (`metrics`) and dashboard use query().
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+DEFAULT_COLLECTOR_PORT = 9090
+DEFAULT_INTERVAL_S = 1.0
+DEFAULT_RETENTION = 900  # samples kept per service (15 min at 1s)
+
+REQUESTS = "stitch_mock_requests_total"
+DURATION_BUCKET = "stitch_mock_request_duration_seconds_bucket"
+IN_FLIGHT = "stitch_mock_requests_in_flight"
+PUBLISHED = "stitch_nats_publish_published_total"
+CONSUMED = "stitch_nats_consume_handled_total"
+QUEUE_DEPTH = "stitch_nats_publish_queue_depth"
+COUNTERS = ("requests", "errors", "published", "consumed")
+# a worker pid not scraped for this long is considered gone
+PROCESS_EXPIRY_S = 300.0
+
+
+def parse_metrics(text: str) -> list:
+    """Prometheus text format -> [(name, {label: value}, float)]; comments skipped."""
+    out = []
+    for line in text.splitlines():
+        if not line or line[0] == "#":
+            continue
+        head, _, value = line.rpartition(" ")
+        labels = {}
+        if "{" in head:
+            name, _, rest = head.partition("{")
+            for part in _split_labels(rest.rstrip("}")):
+                k, _, v = part.partition("=")
+                labels[k] = v.strip('"').replace('\\"', '"').replace("\\\\", "\\")
+        else:
+            name = head
+        try:
+            out.append((name, labels, float(value)))
+        except ValueError:
+            continue
+    return out
+
+
+def _split_labels(s: str) -> list:
+    parts, current, quoted, escaped = [], [], False, False
+    for ch in s:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+        elif ch == "," and not quoted:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(ch)
+    if current:
+        parts.append("".join(current))
+    return parts
+
+
+def summarize(metrics: list, t: float) -> dict:
+    """One compact sample of a service from its parsed metrics."""
+    sample = {"t": t, "requests": 0.0, "errors": 0.0, "buckets": {}, "in_flight": 0.0,
+              "published": 0.0, "consumed": 0.0, "queue_depth": 0.0}
+    for name, labels, value in metrics:
+        if name == REQUESTS:
+            sample["requests"] += value
+            if labels.get("status", "").startswith("5"):
+                sample["errors"] += value
+        elif name == DURATION_BUCKET:
+            le = labels.get("le", "+Inf")
+            sample["buckets"][le] = sample["buckets"].get(le, 0.0) + value
+        elif name == IN_FLIGHT:
+            sample["in_flight"] += value
+        elif name == PUBLISHED:
+            sample["published"] += value
+        elif name == CONSUMED:
+            sample["consumed"] += value
+        elif name == QUEUE_DEPTH:
+            sample["queue_depth"] += value
+    return sample
+
+
+def split_by_process(metrics: list) -> dict:
+    """{pid: metrics} by the `pid` label ("" for targets that do not set it)."""
+    out = {}
+    for m in metrics:
+        out.setdefault(m[1].get("pid", ""), []).append(m)
+    return out
+
+
+def combine(samples: list, t: float) -> dict:
+    """Sum per-process samples into one service sample."""
+    total = {"t": t, "requests": 0.0, "errors": 0.0, "buckets": {}, "in_flight": 0.0,
+             "published": 0.0, "consumed": 0.0, "queue_depth": 0.0}
+    for s in samples:
+        for key in ("requests", "errors", "in_flight", "published", "consumed", "queue_depth"):
+            total[key] += s.get(key, 0.0)
+        for le, n in s["buckets"].items():
+            total["buckets"][le] = total["buckets"].get(le, 0.0) + n
+    return total
+
+
+def _delta(new: float, old: float) -> float:
+    # a counter going backwards means the mock restarted
+    return new - old if new >= old else new
+
+
+def histogram_quantile(q: float, buckets: dict) -> float:
+    """Quantile (seconds) from cumulative {le: count} buckets, interpolated like Prometheus."""
+    bounds = sorted((math.inf if le == "+Inf" else float(le), n) for le, n in buckets.items())
+    if not bounds or bounds[-1][1] <= 0:
+        return 0.0
+    rank = q * bounds[-1][1]
+    prev_le, prev_n = 0.0, 0.0
+    for le, n in bounds:
+        if n >= rank:
+            if math.isinf(le):
+                return prev_le
+            if n == prev_n:
+                return le
+            return prev_le + (le - prev_le) * (rank - prev_n) / (n - prev_n)
+        prev_le, prev_n = le, n
+    return prev_le
+
+
+def window_stats(old: dict, new: dict) -> dict:
+    """Rates and latency percentiles between two samples of one service."""
+    dt = new["t"] - old["t"]
+    requests = _delta(new["requests"], old["requests"])
+    errors = _delta(new["errors"], old["errors"])
+    buckets = {le: _delta(n, old["buckets"].get(le, 0.0)) for le, n in new["buckets"].items()}
+    return {
+        "window_s": round(dt, 3),
+        "requests": int(requests),
+        "errors": int(errors),
+        "rps": round(requests / dt, 2) if dt > 0 else 0.0,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "latency_ms": {f"p{q:g}": round(histogram_quantile(q / 100.0, buckets) * 1000.0, 3) for q in (50, 90, 99)},
+        "in_flight": int(new["in_flight"]),
+        "nats_published_per_s": round(_delta(new["published"], old["published"]) / dt, 2) if dt > 0 else 0.0,
+        "nats_consumed_per_s": round(_delta(new["consumed"], old["consumed"]) / dt, 2) if dt > 0 else 0.0,
+        "nats_queue_depth": int(new["queue_depth"]),
+        "_buckets": buckets,
+    }
+
+
+class Collector:
+    def __init__(self, targets: dict, interval_s: float = DEFAULT_INTERVAL_S, retention: int = DEFAULT_RETENTION):
+        self.targets = targets  # service -> metrics URL
+        self.interval_s = interval_s
+        self.samples = {name: deque(maxlen=retention) for name in targets}
+        self.processes = {name: {} for name in targets}  # service -> {pid: latest sample}
+        # counters of expired pids, so dropping them never makes the sum go backwards
+        self.retired = {name: combine([], 0.0) for name in targets}
+        self.status = {name: {"up": False, "last_scrape": None, "error": None} for name in targets}
+
+    async def scrape_once(self, client: httpx.AsyncClient):
+        async def one(name, url):
+            try:
+                r = await client.get(url)
+                r.raise_for_status()
+            except Exception as e:
+                self.status[name].update(up=False, error=f"{type(e).__name__}: {e}")
+                return
+            now = time.time()
+            self._record(name, parse_metrics(r.text), now)
+            self.status[name].update(up=True, last_scrape=now, error=None)
+
+        await asyncio.gather(*(one(name, url) for name, url in self.targets.items()))
+
+    def _record(self, name: str, metrics: list, now: float):
+        processes = self.processes[name]
+        for pid, pid_metrics in split_by_process(metrics).items():
+            processes[pid] = summarize(pid_metrics, now)
+        for pid in [pid for pid, s in processes.items() if now - s["t"] > PROCESS_EXPIRY_S]:
+            gone = processes.pop(pid)
+            retired = self.retired[name]
+            for key in COUNTERS:
+                retired[key] += gone[key]
+            for le, n in gone["buckets"].items():
+                retired["buckets"][le] = retired["buckets"].get(le, 0.0) + n
+        self.samples[name].append(combine([self.retired[name], *processes.values()], now))
+
+    async def run(self):
+        # no keep-alive: a reused connection would always reach the same worker
+        limits = httpx.Limits(max_keepalive_connections=0)
+        async with httpx.AsyncClient(timeout=self.interval_s * 2, limits=limits) as client:
+            next_at = time.monotonic()
+            while True:
+                await self.scrape_once(client)
+                next_at += self.interval_s
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+    def _window(self, name: str, window_s: float):
+        buf = self.samples[name]
+        if len(buf) < 2:
+            return None
+        new = buf[-1]
+        # newest sample at least window_s older than the latest (or the oldest we have)
+        old = buf[0]
+        for s in reversed(buf):
+            if new["t"] - s["t"] >= window_s:
+                old = s
+                break
+        return old, new
+
+    def query(self, window_s: float = 60.0) -> dict:
+        services, total_buckets = {}, {}
+        total = {"requests": 0, "errors": 0, "rps": 0.0, "in_flight": 0, "nats_published_per_s": 0.0,
+                 "nats_consumed_per_s": 0.0}
+        for name in self.targets:
+            pair = self._window(name, window_s)
+            if pair is None:
+                services[name] = {"up": self.status[name]["up"], "samples": len(self.samples[name])}
+                continue
+            stats = window_stats(*pair)
+            for le, n in stats.pop("_buckets").items():
+                total_buckets[le] = total_buckets.get(le, 0.0) + n
+            services[name] = {"up": self.status[name]["up"], **stats}
+            total["requests"] += stats["requests"]
+            total["rps"] += stats["rps"]
+            total["errors"] += stats["errors"]
+            total["in_flight"] += stats["in_flight"]
+            total["nats_published_per_s"] += stats["nats_published_per_s"]
+            total["nats_consumed_per_s"] += stats["nats_consumed_per_s"]
+        total["rps"] = round(total["rps"], 2)
+        total["error_rate"] = round(total["errors"] / total["requests"], 4) if total["requests"] else 0.0
+        total["latency_ms"] = {f"p{q:g}": round(histogram_quantile(q / 100.0, total_buckets) * 1000.0, 3)
+                               for q in (50, 90, 99)}
+        return {"window_s": window_s, "at": time.time(), "services": services, "total": total}
+
+    def series(self, name: str, window_s: float = 60.0) -> list:
+        """Per-scrape-interval rows for the last window_s seconds of one service."""
+        buf = list(self.samples.get(name, ()))
+        if not buf:
+            return []
+        cutoff = buf[-1]["t"] - window_s
+        rows = []
+        for old, new in zip(buf, buf[1:]):
+            if new["t"] < cutoff:
+                continue
+            stats = window_stats(old, new)
+            rows.append({"t": round(new["t"], 3), "rps": stats["rps"], "error_rate": stats["error_rate"],
+                         "p99_ms": stats["latency_ms"]["p99"], "in_flight": stats["in_flight"]})
+        return rows
+
+    def services(self) -> dict:
+        return {name: {"url": url, "samples": len(self.samples[name]), **self.status[name]}
+                for name, url in self.targets.items()}
+
+
+async def _handle_http(collector: Collector, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # headers are not needed
+        parts = request_line.decode("latin-1").split()
+        url = urlsplit(parts[1] if len(parts) > 1 else "/")
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        window = float(params.get("window", 60))
+        status = "200 OK"
+        if url.path == "/services":
+            body = collector.services()
+        elif url.path == "/query":
+            body = collector.query(window)
+        elif url.path == "/series" and params.get("service") in collector.targets:
+            body = {"service": params["service"], "rows": collector.series(params["service"], window)}
+        else:
+            status, body = "404 Not Found", {"error": f"unknown query {url.path}"}
+        payload = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status}\r\ncontent-type: application/json\r\ncontent-length: {len(payload)}\r\n"
+                     f"connection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+    except Exception as e:
+        print(f"[collector] bad request: {e}")
+    finally:
+        writer.close()
+
+
+async def serve(collector: Collector, host: str = "0.0.0.0", port: int = DEFAULT_COLLECTOR_PORT):
+    server = await asyncio.start_server(lambda r, w: _handle_http(collector, r, w), host, port)
+    print(f"[collector] scraping {len(collector.targets)} services every {collector.interval_s}s, "
+          f"serving queries on {host}:{port}")
+    scraper = asyncio.create_task(collector.run())
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            scraper.cancel()
+
+
+def query(url: str = f"http://localhost:{DEFAULT_COLLECTOR_PORT}", window_s: float = 60.0, timeout: float = 5.0) -> dict:
+    """Aggregated stats from a running collector (used by the CLI and dashboard)."""
+    r = httpx.get(f"{url.rstrip('/')}/query", params={"window": window_s}, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def series(url: str, service: str, window_s: float = 60.0, timeout: float = 5.0) -> list:
+    r = httpx.get(f"{url.rstrip('/')}/series", params={"service": service, "window": window_s}, timeout=timeout)
+    r.raise_for_status()
+    return r.json()["rows"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ServiceStitch metrics collector")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_COLLECTOR_PORT)
+    parser.add_argument("--interval", type=float, default=float(os.getenv("COLLECTOR_INTERVAL_S", DEFAULT_INTERVAL_S)))
+    parser.add_argument("--retention", type=int, default=int(os.getenv("COLLECTOR_RETENTION", DEFAULT_RETENTION)))
+    parser.add_argument("--targets", default=os.getenv("COLLECTOR_TARGETS", "{}"),
+                        help='JSON {"service": "http://host:port/metrics"}')
+    args = parser.parse_args()
+    collector = Collector(json.loads(args.targets), args.interval, args.retention)
+    asyncio.run(serve(collector, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
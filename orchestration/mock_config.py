@@ -0,0 +1,26 @@
+# orchestration/mock_config.py
+"""
+Host-group rules shared by generate_compose (CLI side) and mock_host (in
+the container), kept free of web/NATS imports so the CLI can use them.
+"""
+
+HOST_ROUTING_MODES = ("port", "host", "path")
+
+
+def check_host_group(group: str, services: list, routing: str = "port"):
+    """
+    Validate a host group's mock configs ({"service", "port", "workers", ...});
+    raises ValueError. A host is one process, so workers must be 1, and each
+    mock needs its own routing key (port, or service name for host/path).
+    """
+    if routing not in HOST_ROUTING_MODES:
+        raise ValueError(f"{group}: routing must be one of {HOST_ROUTING_MODES}, got {routing!r}")
+    seen = {}
+    for cfg in services:
+        name = cfg["service"]
+        if int(cfg.get("workers", 1)) != 1:
+            raise ValueError(f"{name}: workers is not supported for mocks in a host group (a host is one process)")
+        key = int(cfg.get("port", 8000)) if routing == "port" else name
+        if key in seen:
+            raise ValueError(f"{group}: {name} and {seen[key]} both use {'port ' if routing == 'port' else ''}{key}")
+        seen[key] = name
@@ -0,0 +1,156 @@
+# orchestration/mock_host.py
+"""
+Serve several mock services from one process.
+
+Mocks that share a `host:` group in services.yaml run as MockService
+instances in a single uvicorn process: one event loop, one NATS connection
+(each service keeps its own publish queue, subscriptions, metrics and
+traces). Requests reach a service by one of three routing modes:
+
+    port    every service keeps its own port; the host listens on all of them
+    host    one port; the Host header's first label picks the service
+            (`auth`, `auth.localhost`, `auth:80`)
+    path    one port; the first path segment picks the service and is
+            stripped (`/auth/login` -> auth's `/login`)
+
+The host reads MOCK_HOST_CONFIG, a JSON file written by docker_manager:
+
+    {"host": "edge", "routing": "port", "nats_url": "...",
+     "services": [{"service": "auth", "port": 8001, "endpoints": [...]}, ...]}
+
+Run it with `python -m orchestration.mock_host`.
+"""
+import asyncio
+import json
+import os
+import socket
+
+import uvicorn
+from starlette.applications import Starlette
+
+from orchestration.mock_config import check_host_group
+from orchestration.mock_service import DEFAULT_NATS_URL, MockService, PrebuiltResponse, _encode, _json_headers, nats
+
+# the single listening port for host/path routing, inside the container
+SHARED_PORT = 80
+
+
+class MockHost:
+    """ASGI app dispatching to per-service Starlette apps; owns the lifespan and the NATS connection."""
+
+    def __init__(self, name: str, services: list, routing: str = "port", nats_url: str = DEFAULT_NATS_URL):
+        check_host_group(name, services, routing)
+        self.name = name
+        self.routing = routing
+        self.nats_url = nats_url
+        self.nc = None
+        self.services = []
+        self.apps = {}  # port (port routing) or service name -> Starlette app
+        for cfg in services:
+            svc = MockService(cfg)
+            sub_app = Starlette()
+            svc.mount(sub_app)
+            self.apps[int(cfg.get("port", 8000)) if routing == "port" else svc.name] = sub_app
+            self.services.append(svc)
+        body = _encode({"error": "no hosted mock matches this request", "host": name,
+                        "services": [svc.name for svc in self.services]})
+        self._not_found = PrebuiltResponse(body, _json_headers(body), 404)
+
+    @property
+    def ports(self) -> list:
+        return sorted(self.apps) if self.routing == "port" else [SHARED_PORT]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if self.routing == "port":
+            server = scope.get("server")
+            app = self.apps.get(server[1]) if server else None
+        elif self.routing == "host":
+            app = self.apps.get(_host_label(scope))
+        else:
+            app, scope = self._by_prefix(scope)
+        if app is None:
+            return await self._not_found(scope, receive, send)
+        await app(scope, receive, send)
+
+    def _by_prefix(self, scope):
+        # like Starlette's Mount: the path stays whole and the prefix moves into root_path
+        root_path = scope.get("root_path", "")
+        name = scope["path"][len(root_path):].split("/", 2)[1]
+        app = self.apps.get(name)
+        if app is None:
+            return None, scope
+        return app, {**scope, "root_path": f"{root_path}/{name}"}
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        # one connection for the whole host, shared by every service's publisher and subscriptions
+        if nats is not None:
+            self.nc = await nats.connect(self.nats_url, name=f"{self.name}-{os.getpid()}")
+            for svc in self.services:
+                await svc.start(self.nc)
+            print(f"[MOCK HOST] {self.name}: connected to {self.nats_url}")
+        print(f"[MOCK HOST] {self.name}: serving {', '.join(svc.name for svc in self.services)} "
+              f"by {self.routing} on port(s) {', '.join(map(str, self.ports))}")
+
+    async def shutdown(self):
+        if self.nc is not None:
+            await asyncio.gather(*(svc.stop() for svc in self.services))
+            await self.nc.drain()
+
+
+def _host_label(scope) -> str:
+    for key, value in scope["headers"]:
+        if key == b"host":
+            return value.decode("latin-1").split(":", 1)[0].split(".", 1)[0].lower()
+    return ""
+
+
+def load_host(path: str) -> MockHost:
+    with open(path, "r") as f:
+        cfg = json.load(f)
+    return MockHost(cfg["host"], cfg["services"], cfg.get("routing", "port"),
+                    cfg.get("nats_url") or os.getenv("NATS_URL", DEFAULT_NATS_URL))
+
+
+def _listen(port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve several mock services from one process")
+    parser.add_argument("--config", default=os.getenv("MOCK_HOST_CONFIG", "/etc/servicestitch/host.json"))
+    parser.add_argument("--loop", default="auto")
+    parser.add_argument("--http", default="auto")
+    parser.add_argument("--no-access-log", action="store_true")
+    args = parser.parse_args()
+
+    host = load_host(args.config)
+    config = uvicorn.Config(host, loop=args.loop, http=args.http, access_log=not args.no_access_log,
+                            lifespan="on")
+    uvicorn.Server(config).run(sockets=[_listen(port) for port in host.ports])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# orchestration/mock_metrics.py
+"""
+Prometheus text-format metrics for a mock service process.
+
+Counters are plain ints and lists updated from the event loop thread, so
+recording needs no locks: a request costs a dict lookup, a bisect into the
+latency buckets and a few increments. The text is only built when
+/metrics is scraped. Counters are per process, so every sample carries a
+`pid` label; with several workers each scrape sees one worker's counters.
+"""
+import bisect
+import os
+
+# seconds, upper bounds of the latency histogram buckets (+Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_METRICS_PATH = "/metrics"
+# mock_service's own endpoints live under this prefix
+INTERNAL_PREFIX = "/_stitch"
+
+
+def check_reserved_paths(endpoints: list, metrics_path: str = DEFAULT_METRICS_PATH, service: str = "mock"):
+    """Reject user endpoints that would collide with the metrics or internal endpoints."""
+    for ep in endpoints:
+        path = ep["path"].rstrip("/") or "/"
+        if path == metrics_path.rstrip("/") or path == INTERNAL_PREFIX or path.startswith(INTERNAL_PREFIX + "/"):
+            raise ValueError(f"{service}: endpoint path {ep['path']!r} is reserved "
+                             f"({metrics_path} and {INTERNAL_PREFIX}/... belong to the mock runtime; "
+                             f"set metrics_path to move metrics elsewhere)")
+
+
+class RouteMetrics:
+    __slots__ = ("route", "status", "buckets", "latency_sum", "count", "faults", "delays", "delay_sum")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.status = {}  # status code -> requests
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.faults = 0
+        self.delays = 0
+        self.delay_sum = 0.0
+
+    def observe(self, status: int, seconds: float):
+        self.status[status] = self.status.get(status, 0) + 1
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_sum += seconds
+        self.count += 1
+
+    def delayed(self, ms: float):
+        self.delays += 1
+        self.delay_sum += ms / 1000.0
+
+
+class MockMetrics:
+    def __init__(self, service: str):
+        self.service = service
+        self.routes = {}
+        self.in_flight = 0
+
+    def route(self, route: str) -> RouteMetrics:
+        rm = self.routes.get(route)
+        if rm is None:
+            rm = self.routes[route] = RouteMetrics(route)
+        return rm
+
+    def render(self, publisher: dict = None, subscriber: dict = None) -> bytes:
+        """The whole exposition; `publisher`/`subscriber` are the NATS stats dicts."""
+        # each uvicorn worker has its own counters: the pid label tells them apart
+        base = f'service="{_escape(self.service)}",pid="{os.getpid()}"'
+        out = []
+
+        def family(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        family("stitch_mock_requests_total", "counter", "Requests handled, by route and status code.")
+        for rm in self.routes.values():
+            route = _escape(rm.route)
+            for status, n in sorted(rm.status.items()):
+                out.append(f'stitch_mock_requests_total{{{base},route="{route}",status="{status}"}} {n}')
+
+        family("stitch_mock_request_duration_seconds", "histogram", "Time spent in the endpoint handler.")
+        for rm in self.routes.values():
+            labels = f'{base},route="{_escape(rm.route)}"'
+            cumulative = 0
+            for le, n in zip(LATENCY_BUCKETS, rm.buckets):
+                cumulative += n
+                out.append(f'stitch_mock_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            out.append(f'stitch_mock_request_duration_seconds_bucket{{{labels},le="+Inf"}} {rm.count}')
+            out.append(f"stitch_mock_request_duration_seconds_sum{{{labels}}} {rm.latency_sum:.6f}")
+            out.append(f"stitch_mock_request_duration_seconds_count{{{labels}}} {rm.count}")
+
+        family("stitch_mock_injected_faults_total", "counter", "Requests failed on purpose by failure_rate.")
+        for rm in self.routes.values():
+            out.append(f'stitch_mock_injected_faults_total{{{base},route="{_escape(rm.route)}"}} {rm.faults}')
+
+        family("stitch_mock_injected_delays_total", "counter", "Requests delayed on purpose by delay.")
+        for rm in self.routes.values():
+            out.append(f'stitch_mock_injected_delays_total{{{base},route="{_escape(rm.route)}"}} {rm.delays}')
+
+        family("stitch_mock_injected_delay_seconds_total", "counter", "Total injected delay.")
+        for rm in self.routes.values():
+            out.append(f'stitch_mock_injected_delay_seconds_total{{{base},route="{_escape(rm.route)}"}} '
+                       f"{rm.delay_sum:.6f}")
+
+        family("stitch_mock_requests_in_flight", "gauge", "Requests currently inside an endpoint handler.")
+        out.append(f'stitch_mock_requests_in_flight{{{base}}} {self.in_flight}')
+
+        if publisher is not None:
+            for key, help_text in (
+                ("enqueued", "NATS messages queued for publishing."),
+                ("published", "NATS messages handed to the client."),
+                ("dropped", "NATS messages dropped by the overflow policy."),
+                ("overflowed", "NATS messages queued past max_queue (overflow: count)."),
+                ("errors", "NATS publish/flush errors."),
+            ):
+                name = f"stitch_nats_publish_{key}_total"
+                family(name, "counter", help_text)
+                out.append(f'{name}{{{base}}} {publisher[key]}')
+            family("stitch_nats_publish_queue_depth", "gauge", "Messages waiting in the publish queue.")
+            out.append(f'stitch_nats_publish_queue_depth{{{base}}} {publisher["depth"]}')
+            family("stitch_nats_publish_lag_seconds_max", "gauge", "Largest enqueue-to-publish delay seen.")
+            out.append(f'stitch_nats_publish_lag_seconds_max{{{base}}} '
+                       f'{publisher["publish_lag_ms"]["max"] / 1000.0:.6f}')
+
+        if subscriber is not None:
+            for key, help_text in (
+                ("received", "NATS messages received by subscriptions."),
+                ("handled", "NATS messages whose actions completed."),
+                ("errors", "NATS messages whose actions failed."),
+                ("unrouted", "NATS messages with no action to run."),
+            ):
+                name = f"stitch_nats_consume_{key}_total"
+                family(name, "counter", help_text)
+                out.append(f'{name}{{{base}}} {subscriber[key]}')
+
+        out.append("")
+        return "\n".join(out).encode()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
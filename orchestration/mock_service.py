@@ -1,103 +1,434 @@
 # servicestitch/orchestration/mock_service.py
 import os
 import json
-import time
 import random
 import asyncio
+import itertools
+import time
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+
+from orchestration.fault_injection import compile_latency, maybe_delay
+from orchestration.mock_metrics import CONTENT_TYPE, DEFAULT_METRICS_PATH, INTERNAL_PREFIX, MockMetrics, \
+    check_reserved_paths
+from orchestration.publish_queue import PublishQueue
+from orchestration.templating import RenderContext, compile_template
+from orchestration import tracing
 
 try:
     import nats
 except ImportError:
     nats = None
 
-app = FastAPI()
-
-# ---- Load environment variables ----
-MOCK_ENDPOINTS = json.loads(os.getenv("MOCK_ENDPOINTS", "[]"))
-NATS_SUBSCRIBE = json.loads(os.getenv("NATS_SUBSCRIBE", "[]"))
-NATS_URL = os.getenv("NATS_URL", "nats://nats:4222")
-
-# ---- Global NATS publisher connection ----
-nc_pub = None
-
-# ---- HTTP Endpoint Handlers ----
-for ep in MOCK_ENDPOINTS:
-    path = ep["path"]
-    method = ep.get("method", "GET").upper()
-    response_data = ep.get("response", {"status": "ok"})
-    delay = ep.get("delay", 0)
-    failure_rate = ep.get("failure_rate", 0)
-    nats_publish = ep.get("nats_publish", [])
-
-    async def handler(req: Request, _resp=response_data, _delay=delay, _failure=failure_rate, _publish=nats_publish):
-        # Simulate delay
-        if _delay:
-            time.sleep(_delay / 1000.0)
-
-        # Simulate failure
-        if _failure and random.random() < (_failure / 100.0):
-            return JSONResponse(content={"error": "simulated failure"}, status_code=500)
-
-        # Publish to NATS
-        global nc_pub
-        if _publish and nc_pub:
-            for pub in _publish:
-                subj = pub["subject"]
-                data = pub.get("data", {})
-                # replace template placeholders
-                if isinstance(data, dict):
-                    for k, v in data.items():
-                        if isinstance(v, str) and v.startswith("{{") and v.endswith("}}"):
-                            key = v[2:-2].strip()
-                            data[k] = _resp.get(key)
-                await nc_pub.publish(subj, json.dumps(data).encode())
-                print(f"[NATS MOCK] Published to {subj}: {data}")
-
-        return _resp
-
-    app.add_api_route(path, handler, methods=[method])
-
-# ---- NATS Subscriber ----
-async def start_nats_subscriber():
-    if not NATS_SUBSCRIBE or nats is None:
-        return
-
-    nc_sub = await nats.connect(NATS_URL)
-    js = nc_sub.jetstream()
-
-    async def handle_msg(msg):
-        subj = msg.subject
-        payload = msg.data.decode()
-        print(f"[NATS MOCK] Received on {subj}: {payload}")
-
-        for sub in NATS_SUBSCRIBE:
-            if sub.get("subject") == subj:
-                action = sub.get("action")
-                if action:
-                    method, path = action.split(" ", 1)
-                    route = next((r for r in app.routes if r.path == path and method in r.methods), None)
-                    if route:
-                        req = Request(scope={"type": "http", "method": method, "path": path})
-                        response = await route.endpoint(req)
-                        print(f"[NATS MOCK] Triggered {method} {path}, got: {response}")
-
-    for sub in NATS_SUBSCRIBE:
-        await nc_sub.subscribe(sub["subject"], cb=handle_msg)
-
-    print("[NATS MOCK] Subscribed to subjects:", [s["subject"] for s in NATS_SUBSCRIBE])
-
-# ---- FastAPI startup events ----
-@app.on_event("startup")
-async def startup_event():
-    global nc_pub
-
-    # Start NATS publisher connection
-    if nats is not None:
-        nc_pub = await nats.connect(NATS_URL)
-        print(f"[NATS MOCK] Connected to {NATS_URL} for publishing")
-
-    # Start subscriber
-    if NATS_SUBSCRIBE:
-        asyncio.create_task(start_nats_subscriber())
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_NATS_URL = "nats://nats:4222"
+
+# legacy environment variables, used when no config file is mounted
+ENV_SETTINGS = (
+    ("endpoints", "MOCK_ENDPOINTS", json.loads),
+    ("nats_subscribe", "NATS_SUBSCRIBE", json.loads),
+    ("service", "MOCK_SERVICE_NAME", str),
+    ("workers", "MOCK_WORKERS", int),
+    ("nats_publisher", "NATS_PUBLISHER", json.loads),
+    ("nats_concurrency", "NATS_CONCURRENCY", int),
+    ("tracing", "NATS_TRACING", lambda v: v.lower() not in ("0", "false", "no")),
+    ("metrics_path", "MOCK_METRICS_PATH", str),
+    ("nats_url", "NATS_URL", str),
+)
+
+
+# ---- Load the service config ----
+def config_from_env() -> dict:
+    """
+    The mounted per-service config file (MOCK_CONFIG), parsed once at
+    startup, or else the legacy environment variables.
+    """
+    path = os.getenv("MOCK_CONFIG")
+    if path:
+        with open(path, "rb") as f:
+            raw = f.read()
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
+    config = {}
+    for key, var, parse in ENV_SETTINGS:
+        value = os.getenv(var)
+        if value is not None:
+            config[key] = parse(value)
+    return config
+
+
+# ---- Response encoding ----
+def _encode(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class PrebuiltResponse(Response):
+    """A response whose body and headers were encoded once at startup."""
+
+    def __init__(self, body: bytes, raw_headers: list, status_code: int = 200):
+        self.status_code = status_code
+        self.body = body
+        # copied because middleware may append headers in place
+        self.raw_headers = list(raw_headers)
+        self.background = None
+
+
+def _json_headers(body: bytes) -> list:
+    return [
+        (b"content-length", str(len(body)).encode()),
+        (b"content-type", b"application/json"),
+    ]
+
+
+FAILURE_BODY = _encode({"error": "simulated failure"})
+FAILURE_HEADERS = _json_headers(FAILURE_BODY)
+
+
+async def _read_json(req: Request):
+    raw = await req.body()
+    if not raw:
+        return None
+    try:
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except ValueError:
+        return None
+
+
+def _nats_request(method: str, path: str, msg) -> Request:
+    """A minimal request for NATS-triggered actions: the message is the body."""
+    data = msg.data
+
+    async def receive():
+        return {"type": "http.request", "body": data, "more_body": False}
+
+    headers = [(b"nats-subject", msg.subject.encode()), (b"content-type", b"application/json")]
+    if msg.headers:
+        # trace headers ride along so actions that publish continue the chain
+        headers += [(k.lower().encode(), v.encode()) for k, v in msg.headers.items()]
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"", "path_params": {},
+             "headers": headers}
+    return Request(scope, receive)
+
+
+class MockService:
+    """
+    One mock: its endpoint handlers, internal endpoints, metrics, publish
+    queue and NATS subscriptions, built from a config dict (the mounted
+    config file's keys). A process normally runs one (create_app below);
+    mock_host runs several on one event loop and NATS connection.
+    """
+
+    def __init__(self, config: dict):
+        self.name = config.get("service", "mock")
+        self.endpoints = config.get("endpoints", [])
+        self.subscriptions = config.get("nats_subscribe", [])
+        # uvicorn worker processes serving this mock; each one builds its own MockService
+        self.workers = int(config.get("workers", 1))
+        # max NATS-triggered actions running at once in this process
+        self.concurrency = int(config.get("nats_concurrency", 100))
+        # trace headers on published events and per-flow hop latencies on consumed ones
+        self.tracing = config.get("tracing", True) is not False
+        # Prometheus scrape path; reserved, like everything under INTERNAL_PREFIX
+        self.metrics_path = config.get("metrics_path", DEFAULT_METRICS_PATH)
+        check_reserved_paths(self.endpoints, self.metrics_path, self.name)
+
+        # the NATS connection (publishing and subscriptions) and its outbound queue
+        self.nc = None
+        # {max_queue, batch_size, flush_interval_ms, overflow}, see publish_queue.py
+        self.publisher = PublishQueue(**config.get("nats_publisher", {}))
+        self.tracer = tracing.FlowTracer()
+        self.metrics = MockMetrics(self.name)
+        self.subscriber_stats = {"received": 0, "handled": 0, "errors": 0, "unrouted": 0}
+        # (METHOD, path) -> unmetered handler, so NATS actions can call endpoints
+        # directly without showing up in the HTTP request metrics
+        self.handlers = {}
+        self._pullers = []
+
+    def mount(self, app) -> None:
+        """Register the internal endpoints, then the mock endpoints, on a Starlette/FastAPI app."""
+        # registered before the mock endpoints so they cannot shadow them
+        app.add_route(self.metrics_path, self.metrics_endpoint, methods=["GET"])
+        app.add_route(f"{INTERNAL_PREFIX}/nats/publisher", self.publisher_status, methods=["GET"])
+        app.add_route(f"{INTERNAL_PREFIX}/nats/subscriber", self.subscriber_status, methods=["GET"])
+        app.add_route(f"{INTERNAL_PREFIX}/traces", self.trace_status, methods=["GET"])
+
+        for ep in self.endpoints:
+            path = ep["path"]
+            method = ep.get("method", "GET").upper()
+            response_data = ep.get("response", {"status": "ok"})
+            # fixed ms or a distribution, compiled once into a sampler
+            delay = compile_latency(ep.get("delay", 0))
+            failure_rate = ep.get("failure_rate", 0)
+            nats_publish = ep.get("nats_publish", [])
+
+            # plain Starlette route: no FastAPI parameter solving or jsonable_encoder per request
+            handler, handle = self._make_handler(response_data, delay, failure_rate, nats_publish, f"{method} {path}")
+            self.handlers[(method, path)] = handle
+            app.add_route(path, handler, methods=[method])
+
+    # ---- HTTP Endpoint Handlers ----
+    def _make_handler(self, response_data, delay, failure_rate, nats_publish, route: str = ""):
+        """(HTTP handler, which records the route metrics, and the bare handle it wraps)."""
+        # templates are compiled once; static responses are also serialized once
+        response_tpl = compile_template(response_data)
+        publish = []
+        for pub in nats_publish:
+            tpl = compile_template(pub.get("data", {}))
+            publish.append((pub["subject"], tpl, _encode(tpl.source) if tpl.static else None))
+        needs = response_tpl.needs.union(*(tpl.needs for _, tpl, _ in publish))
+        needs_body = "body" in needs
+        counter = itertools.count(1)
+        if response_tpl.static:
+            static_body = _encode(response_data)
+            static_headers = _json_headers(static_body)
+        failure = failure_rate / 100.0 if failure_rate else 0
+        trace = bool(publish) and self.tracing
+        origin = f"{self.name} {route}"
+        metrics = self.metrics
+        publisher = self.publisher
+        rm = metrics.route(route)
+
+        async def handler(req: Request):
+            metrics.in_flight += 1
+            t0 = time.perf_counter()
+            status = 500
+            try:
+                response = await handle(req, rm)
+                status = response.status_code
+                return response
+            finally:
+                metrics.in_flight -= 1
+                rm.observe(status, time.perf_counter() - t0)
+
+        async def handle(req: Request, rm=None):
+            started = time.time() if trace else 0.0
+            # Simulate delay without blocking the event loop for other requests
+            if delay:
+                ms = delay()
+                if rm is not None:
+                    rm.delayed(ms)
+                await maybe_delay(ms)
+
+            # Simulate failure
+            if failure and random.random() < failure:
+                if rm is not None:
+                    rm.faults += 1
+                return PrebuiltResponse(FAILURE_BODY, FAILURE_HEADERS, 500)
+
+            ctx = None
+            if needs:
+                ctx = RenderContext(req, counter, await _read_json(req) if needs_body else None)
+
+            if response_tpl.static:
+                resp = response_data
+                response = PrebuiltResponse(static_body, static_headers)
+            else:
+                resp = response_tpl.render(ctx)
+                body = _encode(resp)
+                response = PrebuiltResponse(body, _json_headers(body))
+
+            # Queue for NATS; the publisher task sends it after the response
+            if publish and self.nc:
+                if ctx is not None:
+                    ctx["response"] = resp
+                headers = tracing.outgoing_headers(req.headers, started, origin) if trace else None
+                for subj, tpl, payload in publish:
+                    if payload is None:
+                        payload = _encode(tpl.render(ctx))
+                    await publisher.put(subj, payload, dict(headers) if headers else None)
+
+            return response
+
+        return handler, handle
+
+    async def publisher_status(self, req: Request):
+        body = _encode({"service": self.name, "pid": os.getpid(), "connected": self.nc is not None,
+                        **self.publisher.stats()})
+        return PrebuiltResponse(body, _json_headers(body))
+
+    async def subscriber_status(self, req: Request):
+        body = _encode({"service": self.name, "pid": os.getpid(), "concurrency": self.concurrency,
+                        **self.subscriber_stats})
+        return PrebuiltResponse(body, _json_headers(body))
+
+    async def trace_status(self, req: Request):
+        if req.query_params.get("reset"):
+            self.tracer.reset()
+        body = _encode({"service": self.name, "pid": os.getpid(), **self.tracer.snapshot()})
+        return PrebuiltResponse(body, _json_headers(body))
+
+    async def metrics_endpoint(self, req: Request):
+        body = self.metrics.render(self.publisher.stats() if self.nc is not None else None,
+                                   self.subscriber_stats if self.subscriptions else None)
+        return PrebuiltResponse(body, [(b"content-length", str(len(body)).encode()),
+                                       (b"content-type", CONTENT_TYPE.encode())])
+
+    # ---- NATS Subscriber ----
+    def build_subscription_index(self, subscriptions: list) -> dict:
+        """
+        Compile `nats_subscribe` into {(subject, queue, jetstream): (action, ...)}
+        once at startup. `action` may be one "METHOD /path" or a list of them,
+        and entries with the same subject/queue/jetstream settings share one
+        subscription. Wildcard subjects (`*`, `>`) are subscribed as-is and
+        matched by the NATS server.
+        """
+        index = {}
+        for sub in subscriptions:
+            actions = sub.get("action") or []
+            if isinstance(actions, str):
+                actions = [actions]
+            # with several workers (or replicas) a queue group makes NATS deliver
+            # each message to only one of them instead of once per process
+            queue = sub.get("queue") or (self.name if self.workers > 1 else "")
+            js = sub.get("jetstream")
+            if js is True:
+                js = {}
+            key = (sub["subject"], queue, json.dumps(js, sort_keys=True) if js is not None else None)
+            compiled = index.setdefault(key, [])
+            for action in actions:
+                method, path = action.split(" ", 1)
+                handler = self.handlers.get((method.upper(), path))
+                if handler is None:
+                    print(f"[NATS MOCK] {self.name}: no endpoint for action {action!r} on {sub['subject']}, ignoring")
+                    continue
+                compiled.append((method.upper(), path, handler))
+        return {key: tuple(actions) for key, actions in index.items()}
+
+    def _durable_name(self, subject: str) -> str:
+        return f"{self.name}-" + "".join(c if c.isalnum() or c in "-_" else "_" for c in subject)
+
+    async def start_nats_subscriber(self, nc):
+        if not self.subscriptions:
+            return
+
+        index = self.build_subscription_index(self.subscriptions)
+        # actions -> "POST /notify, POST /audit", the last part of the flow name
+        labels = {actions: ", ".join(f"{m} {p}" for m, p, _ in actions) for actions in index.values()}
+        limit = asyncio.Semaphore(self.concurrency)
+        inflight = set()  # keeps action tasks referenced until they finish
+        stats = self.subscriber_stats
+        tracer = self.tracer if self.tracing else None
+
+        async def run_actions(msg, actions, received, ack=False):
+            try:
+                started = time.time()
+                for method, path, handler in actions:
+                    await handler(_nats_request(method, path, msg))
+                stats["handled"] += 1
+                if tracer is not None:
+                    tracer.observe(msg.headers, msg.subject, labels[actions], received, started, time.time())
+                if ack:
+                    await msg.ack()
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"[NATS MOCK] {self.name}: action for {msg.subject} failed: {e}")
+                if ack:
+                    # redeliver (possibly to another consumer instance)
+                    await msg.nak()
+            finally:
+                limit.release()
+
+        async def dispatch(msg, actions, ack=False):
+            received = time.time()
+            stats["received"] += 1
+            if not actions:
+                stats["unrouted"] += 1
+                if ack:
+                    await msg.ack()
+                return
+            # waiting here holds back this subscription's delivery when
+            # nats_concurrency actions are already in flight
+            await limit.acquire()
+            task = asyncio.create_task(run_actions(msg, actions, received, ack))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+
+        def make_callback(actions):
+            async def handle_msg(msg):
+                await dispatch(msg, actions)
+            return handle_msg
+
+        async def pull(psub, actions, batch, expires):
+            while True:
+                try:
+                    msgs = await psub.fetch(batch, timeout=expires)
+                except nats.errors.TimeoutError:
+                    continue
+                except Exception as e:
+                    print(f"[NATS MOCK] {self.name}: JetStream fetch failed: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for msg in msgs:
+                    await dispatch(msg, actions, ack=True)
+
+        js = None
+        for (subject, queue, js_cfg), actions in index.items():
+            if js_cfg is None:
+                await nc.subscribe(subject, queue=queue, cb=make_callback(actions))
+                print(f"[NATS MOCK] {self.name} pid {os.getpid()} subscribed to {subject}",
+                      f"(queue group {queue})" if queue else "")
+                continue
+
+            # durable pull consumer: every worker/replica fetching from the same
+            # durable shares its messages, and unacked ones are redelivered
+            js_cfg = json.loads(js_cfg)
+            js = js or nc.jetstream()
+            stream = js_cfg.get("stream")
+            if stream:
+                try:
+                    await js.stream_info(stream)
+                except nats.js.errors.NotFoundError:
+                    await js.add_stream(name=stream, subjects=[subject])
+            durable = js_cfg.get("durable") or self._durable_name(subject)
+            psub = await js.pull_subscribe(subject, durable=durable, stream=stream)
+            self._pullers.append(asyncio.create_task(pull(psub, actions, int(js_cfg.get("batch", 10)),
+                                                          float(js_cfg.get("expires", 5)))))
+            print(f"[NATS MOCK] {self.name} pid {os.getpid()} pulling {subject} via JetStream durable {durable}")
+
+    async def start(self, nc):
+        """Attach to a (possibly shared) NATS connection: start publishing and subscriptions."""
+        self.nc = nc
+        self.publisher.start(nc)
+        await self.start_nats_subscriber(nc)
+
+    async def stop(self):
+        """Flush queued publishes; the caller drains the connection afterwards."""
+        for task in self._pullers:
+            task.cancel()
+        if self.nc is not None:
+            await self.publisher.close()
+
+
+# ---- Single-mock app ----
+def create_app(config: dict = None) -> FastAPI:
+    """
+    One mock per process: `uvicorn --factory orchestration.mock_service:create_app`
+    (each worker builds its own). mock_host serves several MockServices instead.
+    """
+    config = config_from_env() if config is None else config
+    nats_url = config.get("nats_url") or os.getenv("NATS_URL", DEFAULT_NATS_URL)
+    service = MockService(config)
+    app = FastAPI()
+    service.mount(app)
+
+    @app.on_event("startup")
+    async def startup_event():
+        # one connection per worker process, shared by the publisher and subscriptions
+        if nats is not None:
+            nc = await nats.connect(nats_url, name=f"{service.name}-{os.getpid()}")
+            await service.start(nc)
+            print(f"[NATS MOCK] Connected to {nats_url} "
+                  f"(publish queue {service.publisher.max_queue}, overflow {service.publisher.overflow})")
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        if service.nc is not None:
+            await service.stop()
+            await service.nc.drain()
+
+    return app
@@ -1,18 +1,171 @@
 # orchestration/nats_manager.py
+"""
+Long-lived NATS clients for the test harness.
+
+One connection per (event loop, URL) is opened on first use and reused by
+every publish/subscribe/request after that; nats-py reconnects it in the
+background if the server goes away, buffering publishes meanwhile.
+
+    async with NatsClientManager() as nats_client:
+        await nats_client.publish_many(("orders.created", b"...") for _ in range(10_000))
+        reply = await nats_client.request_json("pricing.quote", {"sku": 1})
+
+The module-level publish()/subscribe()/request() helpers use the shared
+client for the running loop; call close_all() before the loop ends.
+"""
 import asyncio
+import json
+
 from nats.aio.client import Client as NATS
 
-async def publish(subject: str, payload: bytes, url: str = "nats://127.0.0.1:4222"):
-    nc = NATS()
-    await nc.connect(url)
-    await nc.publish(subject, payload)
-    await nc.drain()
-    await nc.close()
-
-async def subscribe(subject: str, cb, url: str = "nats://127.0.0.1:4222"):
-    nc = NATS()
-    await nc.connect(url)
-    async def _cb(msg):
-        await cb(msg)
-    await nc.subscribe(subject, cb=_cb)
-    return nc  # caller can keep running (remember to close)
+DEFAULT_URL = "nats://127.0.0.1:4222"
+
+
+class NatsClientManager:
+    def __init__(self, url: str = DEFAULT_URL, name: str = "servicestitch", **connect_opts):
+        self.url = url
+        self.name = name
+        # reconnect forever by default: a restarting broker should not kill the harness
+        self.connect_opts = {"max_reconnect_attempts": -1, "reconnect_time_wait": 1, **connect_opts}
+        self.nc = None
+        self._closing = False
+        self._lock = asyncio.Lock()
+        self.published = 0
+        self.disconnects = 0
+        self.reconnects = 0
+
+    async def connect(self) -> NATS:
+        """The connected client, (re)opening it if needed."""
+        if self.nc is not None and not self.nc.is_closed:
+            return self.nc
+        async with self._lock:
+            if self.nc is None or self.nc.is_closed:
+                nc = NATS()
+                await nc.connect(self.url, name=self.name, error_cb=self._on_error,
+                                 disconnected_cb=self._on_disconnect, reconnected_cb=self._on_reconnect,
+                                 **self.connect_opts)
+                self.nc = nc
+        return self.nc
+
+    async def _on_error(self, e):
+        print(f"[nats_manager] {self.url}: {e}")
+
+    async def _on_disconnect(self):
+        if self._closing:
+            return
+        self.disconnects += 1
+        print(f"[nats_manager] disconnected from {self.url}, reconnecting")
+
+    async def _on_reconnect(self):
+        self.reconnects += 1
+        print(f"[nats_manager] reconnected to {self.nc.connected_url.netloc if self.nc else self.url}")
+
+    async def publish(self, subject: str, payload: bytes = b"", headers: dict = None, flush: bool = False):
+        nc = await self.connect()
+        await nc.publish(subject, payload, headers=headers)
+        self.published += 1
+        if flush:
+            await nc.flush()
+
+    async def publish_many(self, messages, timeout: float = 10.0) -> int:
+        """
+        Pipeline (subject, payload[, headers]) tuples into the connection
+        and flush once at the end; returns how many were published.
+        """
+        nc = await self.connect()
+        publish = nc.publish
+        n = 0
+        for msg in messages:
+            await publish(msg[0], msg[1], headers=msg[2] if len(msg) > 2 else None)
+            n += 1
+        await nc.flush(timeout=timeout)
+        self.published += n
+        return n
+
+    async def flush(self, timeout: float = 10.0):
+        if self.nc is not None and self.nc.is_connected:
+            await self.nc.flush(timeout=timeout)
+
+    async def subscribe(self, subject: str, cb, queue: str = ""):
+        """Subscribe `cb(msg)`; returns the subscription (call .unsubscribe() to stop)."""
+        nc = await self.connect()
+        return await nc.subscribe(subject, queue=queue, cb=cb)
+
+    async def request(self, subject: str, payload: bytes = b"", timeout: float = 2.0, headers: dict = None):
+        nc = await self.connect()
+        return await nc.request(subject, payload, timeout=timeout, headers=headers)
+
+    async def request_json(self, subject: str, obj=None, timeout: float = 2.0):
+        msg = await self.request(subject, json.dumps(obj).encode(), timeout)
+        return json.loads(msg.data) if msg.data else None
+
+    async def reply(self, subject: str, handler, queue: str = ""):
+        """
+        Answer requests on `subject` with `handler(msg)`, which may be async
+        and may return bytes, str or a JSON-serializable object.
+        """
+        async def _cb(msg):
+            result = handler(msg)
+            if asyncio.iscoroutine(result):
+                result = await result
+            if isinstance(result, str):
+                result = result.encode()
+            elif not isinstance(result, (bytes, bytearray)):
+                result = json.dumps(result).encode()
+            await msg.respond(result)
+
+        return await self.subscribe(subject, _cb, queue)
+
+    async def close(self):
+        if self.nc is not None and not self.nc.is_closed:
+            self._closing = True
+            try:
+                await self.nc.drain()
+            finally:
+                self._closing = False
+        self.nc = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+# shared clients, one per (event loop, url): nats-py connections are bound to the loop they were opened on
+_clients = {}
+
+
+def get_client(url: str = DEFAULT_URL) -> NatsClientManager:
+    loop = asyncio.get_running_loop()
+    for key in [k for k in _clients if k[0].is_closed()]:
+        del _clients[key]
+    client = _clients.get((loop, url))
+    if client is None:
+        client = _clients[(loop, url)] = NatsClientManager(url)
+    return client
+
+
+async def close_all():
+    """Drain and close the shared clients of the running loop."""
+    loop = asyncio.get_running_loop()
+    for key in [k for k in _clients if k[0] is loop]:
+        await _clients.pop(key).close()
+
+
+async def publish(subject: str, payload: bytes, url: str = DEFAULT_URL):
+    # flushed so the message has reached the server when this returns, as before
+    await get_client(url).publish(subject, payload, flush=True)
+
+
+async def publish_many(messages, url: str = DEFAULT_URL) -> int:
+    return await get_client(url).publish_many(messages)
+
+
+async def request(subject: str, payload: bytes = b"", timeout: float = 2.0, url: str = DEFAULT_URL):
+    return await get_client(url).request(subject, payload, timeout)
+
+
+async def subscribe(subject: str, cb, url: str = DEFAULT_URL, queue: str = ""):
+    return await get_client(url).subscribe(subject, cb, queue)  # caller can .unsubscribe() it
@@ -0,0 +1,143 @@
+# orchestration/publish_queue.py
+"""
+Bounded in-process NATS publish queue for mock services.
+
+HTTP handlers enqueue (subject, payload, headers) and return; a background
+task drains the queue in batches into the NATS client and flushes it
+periodically, so broker hiccups no longer add to HTTP latency. What happens
+when the queue is full is set by the overflow policy:
+
+    block   the handler waits for space (backpressure, nothing is lost)
+    drop    the new message is discarded and counted in `dropped`
+    count   the message is queued anyway past the bound and counted in
+            `overflowed` (soft limit: nothing is lost, memory can grow)
+"""
+import asyncio
+import time
+from collections import deque
+
+from orchestration.tracing import stamp_sent
+
+OVERFLOW_POLICIES = ("block", "drop", "count")
+
+
+class PublishQueue:
+    def __init__(self, max_queue: int = 10000, batch_size: int = 256, flush_interval_ms: float = 50, overflow: str = "block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.overflow = overflow
+        self._q = deque()
+        self._wake = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = None
+        self._nc = None
+        # metrics
+        self.enqueued = 0
+        self.published = 0
+        self.dropped = 0
+        self.overflowed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.flushes = 0
+
+    def start(self, nc):
+        self._nc = nc
+        self._task = asyncio.create_task(self._drain())
+
+    async def put(self, subject: str, payload: bytes, headers: dict = None) -> bool:
+        """Queue a message; returns False if it was dropped."""
+        q = self._q
+        if len(q) >= self.max_queue:
+            if self.overflow == "drop":
+                self.dropped += 1
+                return False
+            if self.overflow == "count":
+                self.overflowed += 1
+            else:
+                while len(q) >= self.max_queue:
+                    self._space.clear()
+                    await self._space.wait()
+        q.append((subject, payload, headers, time.monotonic()))
+        self.enqueued += 1
+        if len(q) > self.max_depth:
+            self.max_depth = len(q)
+        self._wake.set()
+        return True
+
+    async def _drain(self):
+        q = self._q
+        last_flush = time.monotonic()
+        unflushed = 0
+        while True:
+            if not q:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            n = min(len(q), self.batch_size)
+            publish = self._nc.publish
+            for _ in range(n):
+                subject, payload, headers, enqueued_at = q.popleft()
+                stamp_sent(headers)
+                try:
+                    await publish(subject, payload, headers=headers)
+                    self.published += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[NATS MOCK] publish to {subject} failed: {e}")
+                    continue
+                lag = time.monotonic() - enqueued_at
+                self.lag_total += lag
+                if lag > self.lag_max:
+                    self.lag_max = lag
+            if n:
+                unflushed += n
+                self._space.set()
+            now = time.monotonic()
+            if unflushed and now - last_flush >= self.flush_interval:
+                last_flush = now
+                unflushed = 0
+                try:
+                    await self._nc.flush(timeout=max(self.flush_interval * 10, 1))
+                    self.flushes += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[NATS MOCK] flush failed: {e}")
+            # let request handlers run between batches
+            await asyncio.sleep(0)
+
+    async def close(self):
+        """Publish whatever is still queued, flush and stop the drain task."""
+        if self._task is None:
+            return
+        while self._q and not self._task.done():
+            await asyncio.sleep(self.flush_interval)
+        self._task.cancel()
+        try:
+            await self._nc.flush(timeout=1)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._q),
+            "max_depth": self.max_depth,
+            "max_queue": self.max_queue,
+            "overflow_policy": self.overflow,
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "dropped": self.dropped,
+            "overflowed": self.overflowed,
+            "errors": self.errors,
+            "flushes": self.flushes,
+            "publish_lag_ms": {
+                "mean": round(self.lag_total / self.published * 1000.0, 3) if self.published else 0.0,
+                "max": round(self.lag_max * 1000.0, 3),
+            },
+        }
@@ -0,0 +1,157 @@
+# orchestration/readiness.py
+"""
+Readiness probing for a freshly started stack.
+
+probes_from_config() derives one probe per service in services.yaml, as
+seen from the host running `services up`:
+
+    mocks            GET <metrics path> on the published port (every mock
+                     serves it, hosted ones through their routing mode)
+    NATS images      TCP connect, CONNECT + PING, wait for PONG
+    other infra      TCP connect to the first published port
+    collector/agents GET /services and TCP connect respectively
+
+wait_ready() runs them all concurrently, each retrying until it succeeds or
+the shared deadline passes, and returns every service's time-to-ready.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+from orchestration.docker_manager import mock_address
+from orchestration.mock_metrics import DEFAULT_METRICS_PATH
+
+PROBE_INTERVAL_S = 0.1
+# a single attempt never waits longer than this
+ATTEMPT_TIMEOUT_S = 2.0
+NATS_CLIENT_PORT = 4222
+
+
+@dataclass
+class Probe:
+    name: str
+    kind: str  # "http", "nats" or "tcp"
+    target: str  # URL for http, "host:port" otherwise
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class ProbeResult:
+    name: str
+    target: str
+    ready_s: float = None  # seconds since `started`, None if it never became ready
+    attempts: int = 0
+    error: str = ""
+
+
+def _published_ports(ports: list) -> list:
+    """[(host_port, container_port)] from compose-style "8222:8222" / "127.0.0.1:80:80" entries."""
+    out = []
+    for entry in ports or []:
+        parts = str(entry).split("/")[0].split(":")
+        out.append((int(parts[-2]) if len(parts) > 1 else int(parts[0]), int(parts[-1])))
+    return out
+
+
+def probes_from_config(cfg: dict, host: str = "localhost") -> list:
+    services_cfg = cfg.get("services", {})
+    hosts_cfg = cfg.get("mock_hosts") or {}
+    probes = []
+    for name, spec in services_cfg.items():
+        if spec.get("type") == "mock":
+            url, headers = mock_address(name, spec, hosts_cfg, host)
+            probes.append(Probe(name, "http", url + spec.get("metrics_path", DEFAULT_METRICS_PATH), headers))
+            continue
+        ports = _published_ports(spec.get("ports"))
+        if not ports:
+            continue  # nothing reachable from here
+        if "nats" in spec.get("image", ""):
+            port = next((h for h, c in ports if c == NATS_CLIENT_PORT), ports[0][0])
+            probes.append(Probe(name, "nats", f"{host}:{port}"))
+        else:
+            probes.append(Probe(name, "tcp", f"{host}:{ports[0][0]}"))
+
+    collector_cfg = cfg.get("metrics_collector")
+    if collector_cfg:
+        port = 9090 if collector_cfg is True else collector_cfg.get("port", 9090)
+        probes.append(Probe("metrics-collector", "http", f"http://{host}:{port}/services"))
+    agents_cfg = cfg.get("load_agents") or {}
+    for i in range(agents_cfg.get("count", 0)):
+        probes.append(Probe(f"load-agent-{i}", "tcp", f"{host}:{agents_cfg.get('port', 9100) + i}"))
+    return probes
+
+
+async def _check_http(client: httpx.AsyncClient, probe: Probe):
+    r = await client.get(probe.target, headers=probe.headers)
+    if r.status_code != 200:
+        raise RuntimeError(f"HTTP {r.status_code}")
+
+
+async def _check_tcp(probe: Probe, handshake: bool):
+    host, port = probe.target.rsplit(":", 1)
+    reader, writer = await asyncio.open_connection(host, int(port))
+    try:
+        if handshake:
+            info = await reader.readline()
+            if not info.startswith(b"INFO"):
+                raise RuntimeError(f"unexpected greeting {info[:40]!r}")
+            writer.write(b'CONNECT {"verbose":false,"pedantic":false}\r\nPING\r\n')
+            await writer.drain()
+            reply = await reader.readline()
+            if not reply.startswith(b"PONG"):
+                raise RuntimeError(f"unexpected reply {reply[:40]!r}")
+    finally:
+        writer.close()
+
+
+async def _wait_one(client, probe: Probe, started: float, deadline: float) -> ProbeResult:
+    result = ProbeResult(probe.name, probe.target)
+    while True:
+        result.attempts += 1
+        try:
+            timeout = max(0.05, min(ATTEMPT_TIMEOUT_S, deadline - time.perf_counter()))
+            if probe.kind == "http":
+                await asyncio.wait_for(_check_http(client, probe), timeout)
+            else:
+                await asyncio.wait_for(_check_tcp(probe, probe.kind == "nats"), timeout)
+            result.ready_s = time.perf_counter() - started
+            result.error = ""
+            return result
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        if time.perf_counter() + PROBE_INTERVAL_S > deadline:
+            return result
+        await asyncio.sleep(PROBE_INTERVAL_S)
+
+
+async def wait_ready(probes: list, timeout_s: float = 60.0, started: float = None) -> list:
+    """
+    Probe every service concurrently until all are ready or `timeout_s`
+    passes. `started` (a time.perf_counter() value, default now) is what
+    time-to-ready is measured from, e.g. when `docker compose up` began.
+    """
+    started = time.perf_counter() if started is None else started
+    deadline = time.perf_counter() + timeout_s
+    # no pooling: each attempt opens a fresh connection, like a real first client would
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limits, timeout=ATTEMPT_TIMEOUT_S) as client:
+        return list(await asyncio.gather(*(_wait_one(client, p, started, deadline) for p in probes)))
+
+
+def format_report(results: list) -> str:
+    width = max([len(r.name) for r in results] + [7])
+    lines = [f"{'service':<{width}}  {'ready in':>9}  {'tries':>5}  target"]
+    for r in sorted(results, key=lambda r: (r.ready_s is None, r.ready_s or 0)):
+        ready = f"{r.ready_s * 1000:7.0f}ms" if r.ready_s is not None else "NOT READY"
+        line = f"{r.name:<{width}}  {ready:>9}  {r.attempts:>5}  {r.target}"
+        if r.ready_s is None:
+            line += f"  ({r.error})"
+        lines.append(line)
+    ready = [r.ready_s for r in results if r.ready_s is not None]
+    summary = f"{len(ready)}/{len(results)} ready"
+    if ready and len(ready) == len(results):
+        summary += f", stack ready after {max(ready):.2f}s"
+    lines.append(summary)
+    return "\n".join(lines)
@@ -0,0 +1,205 @@
+# orchestration/scenarios.py
+"""
+Weighted multi-step user flows for the load tester.
+
+A scenario file looks like:
+
+    flows:
+      - name: checkout
+        weight: 3
+        steps:
+          - service: auth
+            method: POST
+            path: /signup
+            json: {"name": "user-{{iteration}}"}
+            extract:
+              user_id: id              # dotted path into the JSON response
+          - service: payments
+            method: POST
+            path: /charge
+            json: {"user_id": "{{user_id}}"}
+
+`service` is resolved from services.yaml to the port it is published on
+(through its host group's routing, if any); a step may give a full `url`
+instead. `{{name}}` placeholders are filled from values
+extracted by earlier steps plus `iteration` and `uuid`.
+"""
+import bisect
+import itertools
+import random
+import uuid
+from pathlib import Path
+
+import yaml
+
+from orchestration.docker_manager import mock_address
+
+
+class Step:
+    def __init__(self, name: str, method: str, url: str, json=None, headers=None, extract=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.json = json
+        self.headers = headers
+        # var -> list of keys into the response body
+        self.extract = {var: str(p).split(".") for var, p in (extract or {}).items()}
+        self.templated = _has_placeholder(url) or _has_placeholder(json) or _has_placeholder(headers)
+
+
+class Flow:
+    def __init__(self, name: str, weight: float, steps: list):
+        self.name = name
+        self.weight = weight
+        self.steps = steps
+
+
+class Scenario:
+    def __init__(self, name: str, flows: list):
+        if not flows:
+            raise ValueError(f"Scenario {name} defines no flows")
+        self.name = name
+        self.flows = flows
+        self.cum_weights = list(itertools.accumulate(f.weight for f in flows))
+        self.iterations = itertools.count()
+
+    def sharded(self, index: int, count: int) -> "Scenario":
+        """Same flows, numbering iterations index, index + count, ... (one of `count` processes)."""
+        shard = Scenario(self.name, self.flows)
+        shard.iterations = itertools.count(index, count)
+        return shard
+
+    def pick(self) -> Flow:
+        r = random.random() * self.cum_weights[-1]
+        return self.flows[bisect.bisect_right(self.cum_weights, r)]
+
+    def step_names(self) -> list:
+        return [s.name for f in self.flows for s in f.steps]
+
+
+def resolve_targets(config_file: str = "services.yaml", host: str = "localhost") -> dict:
+    """Map every mock service in services.yaml to its (base URL, headers) as published on `host`."""
+    with open(config_file, "r") as f:
+        cfg = yaml.safe_load(f)
+    hosts_cfg = cfg.get("mock_hosts") or {}
+    targets = {}
+    for name, spec in cfg.get("services", {}).items():
+        if spec.get("type") == "mock":
+            targets[name] = mock_address(name, spec, hosts_cfg, host)
+    return targets
+
+
+def load_scenario(path: str, config_file: str = "services.yaml", host: str = "localhost") -> Scenario:
+    with open(path, "r") as f:
+        cfg = yaml.safe_load(f)
+    targets = resolve_targets(cfg.get("config", config_file), cfg.get("host", host))
+
+    flows = []
+    for i, flow_cfg in enumerate(cfg.get("flows", [])):
+        steps = []
+        for step_cfg in flow_cfg.get("steps", []):
+            method = step_cfg.get("method", "GET").upper()
+            headers = step_cfg.get("headers")
+            if "url" in step_cfg:
+                url = step_cfg["url"]
+                default_name = f"{method} {url}"
+            else:
+                service = step_cfg["service"]
+                if service not in targets:
+                    raise ValueError(f"Scenario step targets unknown mock service '{service}'")
+                base, target_headers = targets[service]
+                url = base + step_cfg.get("path", "/")
+                if target_headers:
+                    # host routing: the Host header picks the mock
+                    headers = {**target_headers, **(headers or {})}
+                default_name = f"{service} {method} {step_cfg.get('path', '/')}"
+            steps.append(Step(
+                name=step_cfg.get("name", default_name),
+                method=method,
+                url=url,
+                json=step_cfg.get("json"),
+                headers=headers,
+                extract=step_cfg.get("extract"),
+            ))
+        flows.append(Flow(flow_cfg.get("name", f"flow{i}"), float(flow_cfg.get("weight", 1)), steps))
+    return Scenario(cfg.get("name", Path(path).stem), flows)
+
+
+def _has_placeholder(obj) -> bool:
+    if isinstance(obj, str):
+        return "{{" in obj
+    if isinstance(obj, dict):
+        return any(_has_placeholder(v) for v in obj.values())
+    if isinstance(obj, list):
+        return any(_has_placeholder(v) for v in obj)
+    return False
+
+
+def render(obj, variables: dict):
+    """Substitute {{var}} placeholders; a whole-string placeholder keeps the value's type."""
+    if isinstance(obj, str):
+        if "{{" not in obj:
+            return obj
+        if obj.startswith("{{") and obj.endswith("}}") and obj.count("{{") == 1:
+            return variables.get(obj[2:-2].strip())
+        out = obj
+        for key, value in variables.items():
+            out = out.replace("{{" + key + "}}", str(value))
+        return out
+    if isinstance(obj, dict):
+        return {k: render(v, variables) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [render(v, variables) for v in obj]
+    return obj
+
+
+def _lookup(body, keys: list):
+    for key in keys:
+        if isinstance(body, list):
+            body = body[int(key)]
+        else:
+            body = body[key]
+    return body
+
+
+async def run_flow(client, scenario: Scenario, stats, loop, recorder=None, wall_offset: float = 0.0):
+    """
+    Execute one randomly picked flow, recording per-step latency into
+    stats.steps (and every request into `recorder`, if given). Returns False
+    when a step failed and the flow was aborted.
+    """
+    flow = scenario.pick()
+    variables = {"iteration": next(scenario.iterations)}
+    for step in flow.steps:
+        step_stats = stats.step(step.name)
+        url, data, headers = step.url, step.json, step.headers
+        if step.templated:
+            if "uuid" not in variables:
+                variables["uuid"] = uuid.uuid4().hex
+            url, data, headers = render(url, variables), render(data, variables), render(headers, variables)
+        start = loop.time()
+        try:
+            r = await client.request(step.method, url, json=data, headers=headers)
+        except Exception as e:
+            step_stats.errors[type(e).__name__] += 1
+            stats.errors[type(e).__name__] += 1
+            if recorder is not None:
+                recorder.record(start + wall_offset, (loop.time() - start) * 1e6, 0, 0)
+            return False
+        finally:
+            step_stats.latency.record((loop.time() - start) * 1e6)
+        if recorder is not None:
+            recorder.record(start + wall_offset, (loop.time() - start) * 1e6, r.status_code, len(r.content))
+        step_stats.status_codes[r.status_code] += 1
+        stats.status_codes[r.status_code] += 1
+        if r.status_code >= 500:
+            return False
+        if step.extract:
+            try:
+                body = r.json()
+                for var, keys in step.extract.items():
+                    variables[var] = _lookup(body, keys)
+            except (ValueError, KeyError, IndexError, TypeError):
+                stats.errors["ExtractError"] += 1
+                return False
+    return True
@@ -0,0 +1,160 @@
+# orchestration/templating.py
+"""
+Response / NATS payload templates for mock services, compiled once at startup.
+
+Placeholders (whole-string placeholders keep the value's type, embedded
+ones are formatted into the surrounding string):
+
+    {{body.user.id}}      request JSON body
+    {{path.order_id}}     path parameters
+    {{query.page}}        query string
+    {{header.x-user}}     request headers (case-insensitive)
+    {{response.status}}   the rendered HTTP response (NATS payloads)
+    {{key}}               shorthand for {{response.key}}
+    {{counter}}           per-endpoint request counter
+    {{counter.orders}}    named counter shared by every endpoint
+    {{uuid}}              random UUID, one per request
+    {{now}}               ISO-8601 UTC timestamp
+    {{timestamp}} / {{timestamp_ms}}  epoch seconds / milliseconds
+
+Compilation turns a template into a closure tree. Subtrees without
+placeholders are returned as-is (shared, never copied) and rendering always
+builds new containers, so concurrent requests never see each other's values.
+"""
+import itertools
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+
+PLACEHOLDER = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+SOURCES = ("body", "path", "query", "header", "headers", "response")
+GENERATED = ("uuid", "now", "timestamp", "timestamp_ms", "counter")
+
+_named_counters = {}
+
+
+class RenderContext(dict):
+    """
+    Per-request values. Request parts and generated values are looked up
+    lazily on first use and cached, so e.g. {{uuid}} is the same in the HTTP
+    response and the NATS payload of one request.
+    """
+
+    def __init__(self, request=None, counter=None, body=None):
+        super().__init__()
+        self.request = request
+        self.counter = counter
+        if body is not None:
+            self["body"] = body
+
+    def __missing__(self, key):
+        req = self.request
+        if key == "path":
+            value = dict(req.path_params) if req is not None else {}
+        elif key == "query":
+            value = dict(req.query_params) if req is not None else {}
+        elif key in ("header", "headers"):
+            value = {k.lower(): v for k, v in req.headers.items()} if req is not None else {}
+        elif key in ("body", "response"):
+            value = None
+        elif key == "uuid":
+            value = str(uuid.uuid4())
+        elif key == "now":
+            value = datetime.now(timezone.utc).isoformat()
+        elif key == "timestamp":
+            value = time.time()
+        elif key == "timestamp_ms":
+            value = int(time.time() * 1000)
+        elif key == "counter":
+            value = next(self.counter) if self.counter is not None else 0
+        elif key.startswith("counter."):
+            name = key[len("counter."):]
+            value = next(_named_counters.setdefault(name, itertools.count(1)))
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+
+class Template:
+    def __init__(self, source):
+        self.source = source
+        self.needs = set()
+        self._render = self._compile(source)
+        self.static = not self.needs
+
+    def render(self, ctx: RenderContext):
+        return self._render(ctx)
+
+    def _compile(self, obj):
+        if isinstance(obj, str):
+            return self._compile_str(obj)
+        if isinstance(obj, dict):
+            items = [(k, self._compile(v)) for k, v in obj.items()]
+            if all(getattr(f, "constant", False) for _, f in items):
+                return _const(obj)
+            return lambda ctx: {k: f(ctx) for k, f in items}
+        if isinstance(obj, list):
+            fns = [self._compile(v) for v in obj]
+            if all(getattr(f, "constant", False) for f in fns):
+                return _const(obj)
+            return lambda ctx: [f(ctx) for f in fns]
+        return _const(obj)
+
+    def _compile_str(self, s: str):
+        matches = list(PLACEHOLDER.finditer(s))
+        if not matches:
+            return _const(s)
+        if len(matches) == 1 and matches[0].span() == (0, len(s)):
+            return self._resolver(matches[0].group(1))
+        pieces = []
+        pos = 0
+        for m in matches:
+            if m.start() > pos:
+                pieces.append(_const(s[pos:m.start()]))
+            pieces.append(_as_text(self._resolver(m.group(1))))
+            pos = m.end()
+        if pos < len(s):
+            pieces.append(_const(s[pos:]))
+        return lambda ctx: "".join(f(ctx) for f in pieces)
+
+    def _resolver(self, expr: str):
+        head, _, rest = expr.partition(".")
+        if head in GENERATED and (head == "counter" or not rest):
+            self.needs.add(head)
+            return lambda ctx: ctx[expr]
+        if head not in SOURCES:
+            # bare {{key}}: a field of the rendered response
+            head, rest = "response", expr
+        self.needs.add("header" if head == "headers" else head)
+        if head in ("header", "headers"):
+            name = rest.lower()
+            return lambda ctx: ctx["header"].get(name)
+        keys = rest.split(".") if rest else []
+        return lambda ctx: _dig(ctx[head], keys)
+
+
+def _const(value):
+    f = lambda ctx: value  # noqa: E731
+    f.constant = True
+    return f
+
+
+def _as_text(f):
+    return lambda ctx: "" if (v := f(ctx)) is None else str(v)
+
+
+def _dig(value, keys: list):
+    for key in keys:
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+    return value
+
+
+def compile_template(source) -> Template:
+    return Template(source)
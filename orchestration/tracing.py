@@ -0,0 +1,115 @@
+# orchestration/tracing.py
+"""
+Event-flow tracing across HTTP -> NATS -> triggered action.
+
+A mock that publishes from an HTTP endpoint attaches these NATS headers:
+
+    X-Correlation-Id      taken from the HTTP request, or generated; carried
+                          along the whole chain of triggered actions
+    X-Stitch-Trace-Start  when the first HTTP request of the chain arrived
+    X-Stitch-Origin       "<service> <METHOD> <path>" of the publishing endpoint
+    X-Stitch-Origin-At    when that endpoint started handling the request
+    X-Stitch-Enqueued-At  when the payload was queued for publishing
+    X-Stitch-Sent-At      when the publish queue handed it to the client
+
+(timestamps are epoch seconds). The subscribing mock turns them into
+per-hop latencies for its flow, "<origin> -> <subject> -> <actions>":
+
+    http        request start -> publish enqueued
+    publish     enqueued -> sent (publish queue lag)
+    transit     sent -> received by the subscriber (broker + network)
+    dispatch    received -> action started (concurrency limit wait)
+    action      triggered endpoint(s) running
+    end_to_end  first request of the chain -> action finished
+
+Hop latencies across containers use wall clocks, so they are only as good
+as clock sync between them (fine on a single Docker host).
+"""
+import time
+import uuid
+from collections import deque
+
+from orchestration.histogram import LatencyHistogram
+
+TRACE_ID = "X-Correlation-Id"
+TRACE_START = "X-Stitch-Trace-Start"
+ORIGIN = "X-Stitch-Origin"
+ORIGIN_AT = "X-Stitch-Origin-At"
+ENQUEUED_AT = "X-Stitch-Enqueued-At"
+SENT_AT = "X-Stitch-Sent-At"
+
+HOPS = ("http", "publish", "transit", "dispatch", "action", "end_to_end")
+RECENT_TRACES = 100
+
+
+def _ts(t: float) -> str:
+    return f"{t:.6f}"
+
+
+def outgoing_headers(request_headers, started: float, origin: str) -> dict:
+    """Trace headers for a publish made while handling a request that started at `started`."""
+    return {
+        TRACE_ID: request_headers.get(TRACE_ID) or uuid.uuid4().hex,
+        TRACE_START: request_headers.get(TRACE_START) or _ts(started),
+        ORIGIN: origin,
+        ORIGIN_AT: _ts(started),
+        ENQUEUED_AT: _ts(time.time()),
+    }
+
+
+def stamp_sent(headers: dict):
+    """Called by the publish queue right before the payload goes to the client."""
+    if headers is not None and ENQUEUED_AT in headers:
+        headers[SENT_AT] = _ts(time.time())
+
+
+class FlowTracer:
+    def __init__(self, recent: int = RECENT_TRACES):
+        self.flows = {}  # flow -> {hop: LatencyHistogram}
+        self.recent = deque(maxlen=recent)
+
+    def record(self, flow: str, hop: str, seconds: float):
+        hops = self.flows.get(flow)
+        if hops is None:
+            hops = self.flows[flow] = {}
+        h = hops.get(hop)
+        if h is None:
+            h = hops[hop] = LatencyHistogram()
+        h.record(seconds * 1_000_000)
+
+    def observe(self, headers: dict, subject: str, actions: str, received: float, started: float, finished: float):
+        """Record one consumed message; timestamps are time.time() values."""
+        headers = headers or {}
+        flow = f"{headers.get(ORIGIN, 'external')} -> {subject} -> {actions}"
+        hops = {"dispatch": started - received, "action": finished - started}
+        try:
+            origin_at = float(headers[ORIGIN_AT])
+            enqueued_at = float(headers[ENQUEUED_AT])
+            sent_at = float(headers.get(SENT_AT, enqueued_at))
+            hops["http"] = enqueued_at - origin_at
+            hops["publish"] = sent_at - enqueued_at
+            hops["transit"] = received - sent_at
+            hops["end_to_end"] = finished - float(headers.get(TRACE_START, origin_at))
+        except (KeyError, ValueError):
+            pass
+        for hop, seconds in hops.items():
+            self.record(flow, hop, seconds)
+        self.recent.append({
+            "trace_id": headers.get(TRACE_ID),
+            "flow": flow,
+            "at": finished,
+            "hops_ms": {hop: round(hops[hop] * 1000.0, 3) for hop in HOPS if hop in hops},
+        })
+
+    def snapshot(self) -> dict:
+        return {
+            "flows": {
+                flow: {hop: {"count": h.count, **h.summary_ms()} for hop in HOPS if (h := hops.get(hop))}
+                for flow, hops in self.flows.items()
+            },
+            "recent": list(self.recent),
+        }
+
+    def reset(self):
+        self.flows.clear()
+        self.recent.clear()
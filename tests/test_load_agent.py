@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+from orchestration import load_agent, load_tester
+from orchestration.histogram import LatencyHistogram
+from orchestration.load_tester import LoadStats
+
+
+async def _target(counter: list):
+    """Minimal keep-alive HTTP/1.1 server answering every GET with 200."""
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+                counter.append(head.split(b" ", 2)[1])
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Type: text/plain\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def _port(server) -> int:
+    return server.sockets[0].getsockname()[1]
+
+
+def test_run_distributed_splits_rate_and_merges_stats(monkeypatch):
+    jobs = []
+    generate = load_tester.generate
+
+    async def spy(**params):
+        jobs.append(params)
+        return await generate(**params)
+
+    monkeypatch.setattr(load_tester, "generate", spy)
+
+    async def main():
+        hits = []
+        target = await _target(hits)
+        agents = [await load_agent.serve("127.0.0.1", 0, name=f"agent-{i}") for i in range(2)]
+        try:
+            summary = await load_agent.run_distributed(
+                [f"127.0.0.1:{_port(a)}" for a in agents], f"http://127.0.0.1:{_port(target)}/ping",
+                rps=40, duration=1, concurrency=4)
+        finally:
+            for server in agents + [target]:
+                server.close()
+        return summary, hits
+
+    summary, hits = asyncio.run(main())
+    assert sorted(job["rps"] for job in jobs) == [20, 20]
+    assert sorted(job["concurrency"] for job in jobs) == [2, 2]
+    assert summary["agents"] == 2
+    assert summary["sent"] == summary["completed"] == len(hits) == 40
+    assert summary["status_codes"] == {"200": 40}
+    assert summary["error_rate"] == 0.0
+
+
+def test_latency_histogram_round_trip():
+    h = LatencyHistogram()
+    for value in (0, 5, 127, 128, 1_000, 250_000, 61_000_000):
+        h.record(value)
+    back = LatencyHistogram.from_dict(json.loads(json.dumps(h.to_dict())))
+    assert back.counts == h.counts
+    assert (back.count, back.total, back.min, back.max) == (h.count, h.total, h.min, h.max)
+    assert back.summary_ms() == h.summary_ms()
+
+
+def test_load_stats_round_trip():
+    stats = LoadStats()
+    for ms in (1, 2, 30):
+        stats.latency.record(ms * 1000)
+        stats.lag.record(100)
+        stats.queue_wait.record(50)
+    stats.status_codes.update({200: 2, 503: 1})
+    stats.errors["ConnectTimeout"] += 1
+    stats.cpu_s, stats.generators, stats.aborted = 0.25, 2, 1
+    stats.step("login").latency.record(1500)
+    stats.step("login").status_codes[200] += 1
+
+    back = LoadStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+    assert back.to_dict() == stats.to_dict()
+    assert back.summary(4, 1.0) == stats.summary(4, 1.0)
@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+from orchestration import load_capture
+
+
+def test_build_report_counts_until_the_last_response(tmp_path):
+    capture = tmp_path / "run.jsonl"
+    # 10 sends 0.1 s apart, each taking 0.5 s: the run lasts 0.9 + 0.5 s
+    capture.write_text("".join(
+        json.dumps({"ts": 1000.0 + i / 10, "latency_us": 500_000, "status": 200, "bytes": 2}) + "\n" for i in range(10)))
+    report = load_capture.build_report(str(capture))
+    assert report["elapsed_s"] == pytest.approx(1.4)
+    assert report["throughput_rps"] == pytest.approx(10 / 1.4, abs=0.01)
+
+
+def test_load_summary_rejects_find_max_results(tmp_path):
+    result = tmp_path / "knee.json"
+    result.write_text(json.dumps({"knee_rps": 100, "stages": []}))
+    with pytest.raises(ValueError, match="--find-max"):
+        load_capture.load_summary(str(result))
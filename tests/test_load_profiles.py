@@ -0,0 +1,31 @@
+from collections import Counter
+
+from orchestration.load_profiles import arrival_times, parse_profile
+
+
+def per_second(spec: str, duration: float) -> list:
+    profile = parse_profile(spec, duration)
+    counts = Counter(int(t) for t in arrival_times(profile))
+    return [counts[s] for s in range(int(profile.duration))]
+
+
+def test_ramp_from_zero_starts_at_once():
+    assert per_second("ramp:0:1000", 10) == [50, 150, 250, 350, 450, 550, 650, 750, 850, 950]
+
+
+def test_spike_over_low_base_rate():
+    counts = per_second("spike:0.1:500:5:2", 10)
+    assert counts[5:7] == [500, 500]
+    assert sum(counts) == 1001  # 0.1 rps for 8 s plus the spike
+
+
+def test_sharded_spike_keeps_its_shape():
+    shard = parse_profile("spike:0.1:500:5:2", 10).scaled(1 / 4)
+    counts = Counter(int(t) for t in arrival_times(shard))
+    assert counts[5] == counts[6] == 125
+
+
+def test_constant_and_steps():
+    assert per_second("constant:10", 5) == [10] * 5
+    assert per_second("steps:5x2,0x2,20x1", 0) == [5, 5, 0, 0, 20]
+    assert per_second("constant:0", 3) == [0, 0, 0]